@@ -1,12 +1,16 @@
+import os
 import sys
 
 import numpy as np
 
 from pyfluid import Fluid
+# the modules shared between the years live in common next to them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.sink import open_sink
 
 TWITTER = 253, 506
 
-RESOLUTION = 100, 100
+RESOLUTION = tuple(int(d) for d in os.environ.get('RESOLUTION', '100x100').split('x'))
 VISCOSITY = 10 ** -3
 DURATION = 200
 
@@ -39,20 +43,21 @@ for i, p in enumerate(points):
 
     inflow_dye_field[..., i][mask] = 1
 
-for frame in range(DURATION):
-    fluid.advect_diffuse()
+with open_sink(RESOLUTION, pixel_format='rgb24', bytes_per_pixel=3) as frames:
+    for frame in range(DURATION):
+        fluid.advect_diffuse()
 
-    if frame <= INFLOW_DURATION:
-        fluid.velocity_field += inflow_velocity_field
+        if frame <= INFLOW_DURATION:
+            fluid.velocity_field += inflow_velocity_field
 
-        for i, k in enumerate(channels):
-            fluid.quantities[k] += inflow_dye_field[..., i]
+            for i, k in enumerate(channels):
+                fluid.quantities[k] += inflow_dye_field[..., i]
 
-    fluid.project()
+        fluid.project()
 
-    rgb = np.dstack(tuple(fluid.quantities[c] for c in channels))
+        rgb = np.dstack(tuple(fluid.quantities[c] for c in channels))
 
-    rgb = rgb.reshape((*RESOLUTION, 3))
-    rgb = (np.clip(rgb, 0, 1) * 255).astype('uint8')
-    #Image.fromarray(rgb).save(f'{FRAME_PATH}{frame:04d}.png')
-    sys.stdout.buffer.write(rgb.tobytes())
+        rgb = rgb.reshape((*RESOLUTION, 3))
+        rgb = (np.clip(rgb, 0, 1) * 255).astype('uint8')
+        #Image.fromarray(rgb).save(f'{FRAME_PATH}{frame:04d}.png')
+        frames.write(rgb)
@@ -10,7 +10,7 @@ class Fluid:
     def __init__(self, shape, viscosity, quantities):
         self.shape = shape
         # Defining these here keeps the code somewhat more readable vs. computing them every time they're needed.
-        self.size = np.product(shape)
+        self.size = np.prod(shape)
         self.dimensions = len(shape)
 
         # Variable viscosity, both in time and in space, is easy to set up; but it conflicts with the use of
@@ -9,6 +9,12 @@ import cairo
 from PIL import Image, ImageFilter
 from svg.path import parse_path
 
+# the modules shared between the years live in common next to them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.sink import open_sink
+from common import timing
+import preview
+
 
 random.seed(17)
 
@@ -57,7 +63,7 @@ def parse_resolution(resolution: str) -> Tuple[int, ...]:
 
 
 TAU = 2 * pi
-RESOLUTION = parse_resolution(os.environ.get('RESOLUTION', '720x720'))
+RESOLUTION = preview.scale(parse_resolution(os.environ.get('RESOLUTION', '720x720')))
 
 
 def clear(target: cairo.ImageSurface) -> None:
@@ -137,21 +143,35 @@ def animate(f, draw, dt):
     surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
     
     t = 0
+    index = 0
     while t < 1:
-        clear(surface)
-        draw(surface, t, line_width=12)
-        im = from_cairo(surface)
-        blurred = im.filter(ImageFilter.GaussianBlur(radius=4))
-        clear(surface)
-        draw(surface, t, line_width=4)
-        sharp = from_cairo(surface)
-        final = Image.alpha_composite(blurred, sharp)
-        f.write(final.tobytes())
+        if preview.selected(index, t):
+            with timing.stage('draw'):
+                clear(surface)
+                draw(surface, t, line_width=4)
+            with timing.stage('convert'):
+                final = from_cairo(surface)
+            # glow, left out of previews
+            if not preview.ENABLED:
+                with timing.stage('draw'):
+                    clear(surface)
+                    draw(surface, t, line_width=12)
+                with timing.stage('convert'):
+                    im = from_cairo(surface)
+                with timing.stage('blur'):
+                    blurred = im.filter(ImageFilter.GaussianBlur(radius=4))
+                with timing.stage('composite'):
+                    final = Image.alpha_composite(blurred, final)
+            with timing.stage('write'):
+                f.write(final.tobytes())
+            timing.frame()
         t += dt
+        index += 1
 
 
 def main():
-    animate(sys.stdout.buffer, draw, dt=0.008)
+    with open_sink(RESOLUTION) as f:
+        animate(f, draw, dt=0.008)
     
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+"""Draft renders for quick previews, see common/preview.py.
+
+Here a preview also leaves out the glow.
+"""
+import os
+
+from common.preview import scale, selected
+
+
+ENABLED = bool(os.environ.get('PREVIEW'))
@@ -0,0 +1,52 @@
+"""Particle and random generator state saved part way through a simulation.
+
+A checkpoint for frame index holds the state before that frame is simulated,
+so resuming from it and stepping on gives the same frames as running from
+the start. Checkpoints are kept in a directory named by a digest of all the
+simulation inputs, so a changed simulation never picks up stale state.
+"""
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from particles import Particles
+
+
+# arrays making up the state of a particle system
+FIELDS = ('position', 'velocity', 'trace_position', 'trace_velocity', 'head', 'length')
+
+
+def path_for(directory: str, index: int) -> str:
+    return os.path.join(directory, f'{index:06d}.npz')
+
+
+def save(directory: str, index: int, particles: Particles, rng: np.random.Generator) -> None:
+    os.makedirs(directory, exist_ok=True)
+    arrays = {name: getattr(particles, name) for name in FIELDS}
+    # the bit generator state has 128 bit integers, kept exactly as json
+    arrays['rng'] = np.array(json.dumps(rng.bit_generator.state))
+    # write to a temporary file first so a partial checkpoint is never read
+    tmp = path_for(directory, index) + '.tmp.npz'
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, path_for(directory, index))
+
+
+def load(path: str, particles: Particles, rng: np.random.Generator) -> None:
+    """Restores particles and rng in place"""
+    with np.load(path) as arrays:
+        for name in FIELDS:
+            setattr(particles, name, arrays[name])
+        rng.bit_generator.state = json.loads(str(arrays['rng']))
+
+
+def latest(directory: str, index: int) -> Optional[Tuple[int, str]]:
+    """Index and path of the last checkpoint at or before index"""
+    if not os.path.isdir(directory):
+        return None
+    indices = [int(name[:-len('.npz')]) for name in os.listdir(directory) if name.endswith('.npz') and name[:-len('.npz')].isdigit()]
+    indices = [i for i in indices if i <= index]
+    if not indices:
+        return None
+    return max(indices), path_for(directory, max(indices))
@@ -0,0 +1,222 @@
+from math import ceil, radians, sqrt
+from typing import Iterable, Tuple
+
+import numpy as np
+from svgpathtools import Arc, Line, Path
+
+
+def subdivisions(segment, tolerance: float) -> int:
+    """Number of line segments needed to stay within tolerance of the curve"""
+    if isinstance(segment, Line):
+        return 1
+    if isinstance(segment, Arc):
+        # |p''(t)| for an arc is radius * sweep^2
+        curvature = max(abs(segment.radius.real), abs(segment.radius.imag)) * radians(segment.delta) ** 2
+    else:
+        # bound |p''(t)| by the second differences of the control polygon
+        p = np.array(segment.bpoints())
+        degree = len(p) - 1
+        curvature = degree * (degree - 1) * np.max(np.abs(p[2:] - 2 * p[1:-1] + p[:-2]))
+    return max(1, ceil(sqrt(curvature / (8 * tolerance))))
+
+
+def polylines(path: Path, tolerance: float) -> Iterable[np.ndarray]:
+    for segment in path:
+        if isinstance(segment, Path):
+            yield from polylines(segment, tolerance)
+        elif isinstance(segment, Line):
+            yield np.array([segment.start, segment.end])
+        else:
+            ts = np.linspace(0, 1, subdivisions(segment, tolerance) + 1)
+            if isinstance(segment, Arc):
+                yield np.array([segment.point(t) for t in ts])
+            else:
+                yield segment.points(ts)
+
+
+def flatten(path: Path, tolerance: float = 0.1) -> Tuple[np.ndarray, np.ndarray]:
+    """Flattens path into line segments, returned as arrays of start and end points"""
+    starts, ends = [], []
+    for polyline in polylines(path, tolerance):
+        starts.append(polyline[:-1])
+        ends.append(polyline[1:])
+    a, b = np.concatenate(starts), np.concatenate(ends)
+    nonzero = a != b
+    return a[nonzero], b[nonzero]
+
+
+def segment_distance(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Exact distance from points p to line segments a-b, element-wise"""
+    ab = b - a
+    t = np.clip(((p - a) * ab.conjugate()).real / (ab * ab.conjugate()).real, 0, 1)
+    return np.abs(p - (a + t * ab))
+
+
+def winding(segments: Tuple[np.ndarray, np.ndarray], size: Tuple[float, float], resolution: Tuple[int, int]) -> np.ndarray:
+    """Winding number of segments around each pixel, counting crossings left of it per scanline"""
+    a, b = segments
+    width, height = resolution
+    sx, sy = size[0] / (width - 1), size[1] / (height - 1)
+    y = np.arange(height)[:, np.newaxis] * sy
+    # half open rule so vertices shared by two segments are counted once
+    hit = (a.imag <= y) != (b.imag <= y)
+    rows, index = np.nonzero(hit)
+    a, b = a[index], b[index]
+    x = a.real + (y[rows, 0] - a.imag) * (b.real - a.real) / (b.imag - a.imag)
+    columns = np.clip(np.ceil(x / sx), 0, width).astype(int)
+    toggles = np.zeros((height, width + 1), dtype=int)
+    np.add.at(toggles, (rows, columns), np.where(b.imag > a.imag, 1, -1))
+    return np.cumsum(toggles, axis=1)[:, :-1]
+
+
+def inside_mask(
+        segments: Tuple[np.ndarray, np.ndarray],
+        size: Tuple[float, float],
+        resolution: Tuple[int, int],
+        rule: str = 'evenodd',
+) -> np.ndarray:
+    """Rasterizes flattened segments using the svg fill rules, 'evenodd' or 'nonzero'"""
+    w = winding(segments, size, resolution)
+    if rule == 'evenodd':
+        return w % 2 == 1
+    if rule == 'nonzero':
+        return w != 0
+    raise ValueError(f'unknown fill rule {rule}')
+
+
+def nearest_candidates(
+        points: np.ndarray,
+        a: np.ndarray,
+        b: np.ndarray,
+        margin: float,
+        batch: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs of points and segments a-b no further than margin beyond the nearest segment.
+
+    Segments are measured in chunks of about batch distances in total, once for the
+    nearest distance and once to pick the candidates. Pairs are grouped by point.
+    """
+    chunk = max(1, batch // len(points))
+    nearest = np.full(len(points), np.inf)
+    for lo in range(0, len(a), chunk):
+        d = segment_distance(points[:, np.newaxis], a[lo:lo + chunk], b[lo:lo + chunk])
+        np.minimum(nearest, d.min(axis=1), out=nearest)
+    owners, segments = [], []
+    for lo in range(0, len(a), chunk):
+        d = segment_distance(points[:, np.newaxis], a[lo:lo + chunk], b[lo:lo + chunk])
+        owner, segment = np.nonzero(d <= nearest[:, np.newaxis] + margin)
+        owners.append(owner)
+        segments.append(segment + lo)
+    owners, segments = np.concatenate(owners), np.concatenate(segments)
+    order = np.argsort(owners, kind='stable')
+    return owners[order], segments[order]
+
+
+def rounds(groups: np.ndarray) -> Iterable[np.ndarray]:
+    """Indices of the first item of each group, then of the second and so on.
+
+    groups must be sorted. Each round holds at most one item per group, so the
+    items of a round can be scattered to their groups without collisions.
+    """
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    rank = np.arange(len(groups)) - np.repeat(starts, np.diff(np.r_[starts, len(groups)]))
+    order = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[order], np.arange(rank.max() + 2))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        yield order[lo:hi]
+
+
+def distance_field(
+        path: Path,
+        size: Tuple[float, float],
+        resolution: Tuple[int, int],
+        signed: bool = True,
+        tolerance: float = 0.1,
+        tile: int = 8,
+        block: int = 8,
+        batch: int = 2048,
+) -> np.ndarray:
+    """Exact distance to the flattened path for each pixel, negative inside if signed.
+
+    Pixels are processed in tiles, and tiles in blocks of block x block tiles. A
+    segment can only be nearest to some point within radius of a center if it is
+    within twice the radius of the segment nearest the center. Block centers are
+    measured against all segments, tile centers only against the candidates of
+    their block and pixels only against the candidates of their tile.
+
+    Candidates are measured one round at a time, the first candidate of every tile
+    in a batch of about batch tiles, then the second and so on, so memory stays
+    bounded however many segments the path has.
+    """
+    a, b = flatten(path, tolerance)
+    width, height = resolution
+    sx, sy = size[0] / (width - 1), size[1] / (height - 1)
+    span = tile * block
+    blocks_x, blocks_y = -(-width // span), -(-height // span)
+
+    # pixel offsets within a tile and tile center offsets within a block
+    py, px = np.mgrid[0:tile, 0:tile]
+    px, py = (px * sx).ravel(), (py * sy).ravel()
+    ty, tx = np.mgrid[0:block, 0:block]
+    tiles = (tx * tile * sx + 1j * ty * tile * sy).ravel()
+    tile_centers = tiles + 0.5 * (tile - 1) * complex(sx, sy)
+    tile_radius = 0.5 * (tile - 1) * np.hypot(sx, sy)
+    block_radius = 0.5 * (span - 1) * np.hypot(sx, sy)
+
+    by, bx = np.mgrid[0:blocks_y, 0:blocks_x]
+    origins = (bx * span * sx + 1j * by * span * sy).ravel()
+    # tile centers are within block_radius - tile_radius of the block center
+    owners, candidates = nearest_candidates(
+        origins + 0.5 * (span - 1) * complex(sx, sy), a, b, 2 * block_radius, batch * tile * tile)
+    groups = np.searchsorted(owners, np.arange(len(origins) + 1))
+
+    squared = np.full((len(origins), block * block, tile * tile), np.inf)
+    step = max(1, batch // (block * block))
+    for lo in range(0, len(origins), step):
+        hi = min(lo + step, len(origins))
+        owner, segment = owners[groups[lo]:groups[hi]] - lo, candidates[groups[lo]:groups[hi]]
+
+        # tile centers against the candidates of their block, first the nearest distance
+        nearest = np.full((hi - lo, block * block), np.inf)
+        for items in rounds(owner):
+            rows, s = owner[items], segment[items]
+            d = segment_distance(origins[lo + rows, np.newaxis] + tile_centers, a[s, np.newaxis], b[s, np.newaxis])
+            nearest[rows] = np.minimum(nearest[rows], d)
+        keys, pairs = [], []
+        for items in rounds(owner):
+            rows, s = owner[items], segment[items]
+            d = segment_distance(origins[lo + rows, np.newaxis] + tile_centers, a[s, np.newaxis], b[s, np.newaxis])
+            row, index = np.nonzero(d <= nearest[rows] + 2 * tile_radius)
+            keys.append(rows[row] * block * block + index)
+            pairs.append(s[row])
+        keys, pairs = np.concatenate(keys), np.concatenate(pairs)
+        order = np.argsort(keys, kind='stable')
+        keys, pairs = keys[order], pairs[order]
+
+        # pixels against the candidates of their tile, relative to segment start
+        nearest = squared[lo:hi].reshape(-1, tile * tile)
+        for items in rounds(keys):
+            rows, s = keys[items], pairs[items]
+            offset = origins[lo + rows // (block * block)] + tiles[rows % (block * block)] - a[s]
+            ab = (b - a)[s, np.newaxis]
+            # segment direction scaled so the dot product gives the projection parameter
+            u = ab / (ab * ab.conjugate()).real
+            x = offset.real[:, np.newaxis] + px
+            y = offset.imag[:, np.newaxis] + py
+            t = x * u.real
+            t += y * u.imag
+            np.clip(t, 0, 1, out=t)
+            x -= t * ab.real
+            y -= t * ab.imag
+            x *= x
+            y *= y
+            x += y
+            nearest[rows] = np.minimum(nearest[rows], x, out=x)
+
+    sdf = np.sqrt(squared)\
+        .reshape(blocks_y, blocks_x, block, block, tile, tile)\
+        .transpose(0, 2, 4, 1, 3, 5)\
+        .reshape(blocks_y * span, blocks_x * span)[:height, :width]
+    if signed:
+        sdf[inside_mask((a, b), size, resolution)] *= -1
+    return sdf
@@ -1,15 +1,30 @@
-from collections import deque
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from functools import partial
 from math import e, tau
+import os
 import sys
-from typing import Callable, Dict, List, Tuple, TypeVar
+import tempfile
+from typing import BinaryIO, Callable, Generic, List, Optional, Tuple, TypeVar, Union
 
 import cairo
 import numpy as np
-from svgpathtools import parse_path, Path, path_encloses_pt, svg2paths
+from svgpathtools import parse_path, Path, svg2paths
 
+# the modules shared between the years live in common next to them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import preview, timing
+from common.digest import contents, digest
+from common.sink import open_sink
 #from transform import transform
-from perlin import generate_perlin_noise_2d
+import checkpoint
+from perlin import generate_perlin_noise_2d, PerlinNoise3D
+from geometry import distance_field, flatten, inside_mask
+from particles import Particles, is_inside
+from pipeline import Pipeline
+from raster import composite, coverage
+from sampler import AnimatedField, FieldSampler
 
 
 HEART = parse_path("M348.151,54.514c-19.883-19.884-46.315-30.826-74.435-30.826c-28.124,0-54.559,10.942-74.449,30.826l-9.798,9.8l-9.798-9.8 c-19.884-19.884-46.325-30.826-74.443-30.826c-28.117,0-54.56,10.942-74.442,30.826c-41.049,41.053-41.049,107.848,0,148.885 l147.09,147.091c2.405,2.414,5.399,3.892,8.527,4.461c1.049,0.207,2.104,0.303,3.161,0.303c4.161,0,8.329-1.587,11.498-4.764 l147.09-147.091C389.203,162.362,389.203,95.567,348.151,54.514z")
@@ -18,44 +33,14 @@ HEART = parse_path("M348.151,54.514c-19.883-19.884-46.315-30.826-74.435-30.826c-
 Color = Tuple[float, float, float]
 
 
-def create_sdf(path: Path, size: Tuple[float, float], resolution: Tuple[int, int], n: int):
-    x, y = np.meshgrid(
-        np.linspace(0, size[0], resolution[0]),
-        np.linspace(0, size[1], resolution[1]))
-    grid = x + 1j * y
-    sdf = np.inf * np.ones(resolution)
-    for t in np.linspace(0, 1, n):
-        p = path.point(t)
-        d = np.abs(grid - p)
-        sdf = np.minimum(sdf, d)
-    
-    return sdf
-
-
-def create_inside_lookup(path: Path, size: Tuple[float, float], resolution: Tuple[int, int]) -> np.ndarray:
-    inside = np.full(resolution, False)
-    for xi, x in enumerate(np.linspace(0, size[0], resolution[0])):
-        for yi, y in enumerate(np.linspace(0, size[1], resolution[1])):
-            inside[yi, xi] = is_inside_path(path, x + 1j * y)
-
-    return inside
-
-
-def at(grid: np.ndarray, size: Tuple[float, float], p: complex) -> float:
-    x = int(p.imag * grid.shape[0] / size[0])
-    y = int(p.real * grid.shape[1] / size[1])
-    return grid[x, y]
+def create_sdf(path: Path, size: Tuple[float, float], resolution: Tuple[int, int]) -> np.ndarray:
+    """Unsigned distance to path, the particles are attracted to the outline from both sides"""
+    return distance_field(path, size, resolution, signed=False)
 
 
-def at_lerp(grid: np.ndarray, size: Tuple[float, float], p: complex) -> float:
-    x0 = int(p.imag * grid.shape[0] / size[0])
-    y0 = int(p.real * grid.shape[1] / size[1])
-    x1, y1 = x0 + 1, y0 + 1
-    g00 = grid[x0, y0]
-    g10 = grid[x1, y0]
-    g11 = grid[x1, y1]
-    g01 = grid[x0, y1]
-    return (g00 + g10 + g11 + g01) / 4
+def create_inside_lookup(path: Path, size: Tuple[float, float], resolution: Tuple[int, int]) -> FieldSampler:
+    """Field that is 1 inside path and 0 outside"""
+    return FieldSampler(inside_mask(flatten(path), size, resolution).astype(float), size)
 
 
 def encode_frame(im: np.ndarray) -> bytes:
@@ -72,56 +57,10 @@ def autoscale(x: np.ndarray) -> np.ndarray:
     return (x - lo) / (hi - lo)
 
 
-class Dot:
-    def __init__(self, position: complex, velocity: complex):
-        self.position = position
-        self.velocity = velocity
-        self.trace = deque()  # type: deque[Tuple[complex, complex]]
-
-    def update(self, acceleration: complex, dt: float) -> None:
-        self.trace.appendleft((self.position, self.velocity))
-        while len(self.trace) > 32:
-            self.trace.pop()
-
-        self.velocity += acceleration * dt
-        self.position += self.velocity * dt
-
-    def damp(self, damping: float) -> None:
-        self.velocity *= (1.0 - damping)
-
-    def retract(self):
-        """undoes last update"""
-        self.position, self.velocity = self.trace.popleft()
-        #self.velocity = 0
-        if self.trace:
-            self.trace.pop()
-
-    def respawn(self, position: complex, velocity: complex) -> None:
-        self.trace.clear()
-        self.position = position
-        self.velocity = velocity
-
-
-def is_inside(resolution: Tuple[int, int], p: complex):
-    width, height = resolution
-    return 0 < p.real < width and 0 < p.imag < height
-
-
-def cuniform(rng: np.random.Generator, size: Tuple[float, float]) -> complex:
-    width, height = size    
-    return complex(width * rng.random(), height * rng.random())
-
-
-def random_dot(rng: np.random.Generator, size: Tuple[float, float], v: float) -> Dot:
-    return Dot(
-        cuniform(rng, size),
-        v * e ** (tau * 1j * np.random.random()),
-    )
-
-
-def is_inside_path(path: Path, p: complex) -> bool:
-    outside = -100 + -100j
-    return path_encloses_pt(p, outside, path)
+def cuniform(rng: np.random.Generator, size: Tuple[float, float], n: int) -> np.ndarray:
+    width, height = size
+    x, y = rng.random((n, 2)).T
+    return width * x + 1j * (height * y)
 
 
 def clear(target: cairo.ImageSurface, color: Color) -> None:
@@ -131,34 +70,29 @@ def clear(target: cairo.ImageSurface, color: Color) -> None:
     ctx.paint()
 
 
-def draw(target: cairo.ImageSurface, dots: List[Dot], color: Color, line_width: float) -> None:
-    ctx = cairo.Context(target)
-    ctx.set_source_rgb(1, 1, 1)
-    
-    #r = 3
-    ctx.set_line_width(line_width)
-    ctx.set_source_rgb(*color)
-    for dot in dots:
-        for p, _ in dot.trace:
-            ctx.line_to(p.real, p.imag)
-        ctx.stroke()
-        #ctx.arc(dot.position.real, dot.position.imag, r, 0, tau)
-        #ctx.fill()
+def as_array(surface: cairo.ImageSurface) -> np.ndarray:
+    """BGRA view of the surface pixels"""
+    width, height = surface.get_width(), surface.get_height()
+    return np.ndarray(
+        shape=(height, width, 4),
+        dtype=np.uint8,
+        buffer=surface.get_data(),
+        strides=(surface.get_stride(), 4, 1),
+    )
 
 
-gradient_cache = {}  # type: Dict[int, Tuple[np.ndarray, np.ndarray]]
-def gradient(field: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-    if id(field) in gradient_cache:
-        return gradient_cache[id(field)]
-    dy, dx = np.gradient(field)
-    gradient_cache[id(field)] = (dx, dy)
-    return dx, dy
+Segments = Tuple[np.ndarray, np.ndarray]
 
 
-def gradient_at(field: np.ndarray, size: Tuple[float, float], p: complex, at: Callable[[np.ndarray, Tuple[float, float], complex], float]=at) -> complex:
-    """computes the gradient of a fields as a complex (x + yi) coordinate"""
-    dx, dy = gradient(field)
-    return at(dx, size, p) + 1j * at(dy, size, p)
+def draw(target: cairo.ImageSurface, segments: Segments, color: Color, line_width: float) -> None:
+    """Rasterizes all trace segments at once into the surface buffer"""
+    target.flush()
+    resolution = target.get_width(), target.get_height()
+    with timing.stage('draw'):
+        alpha = -np.expm1(-coverage(*segments, line_width, resolution))
+    with timing.stage('composite'):
+        composite(as_array(target), alpha, color)
+    target.mark_dirty()
 
 
 # spawning functions
@@ -171,86 +105,110 @@ def on_path(path: Path, t: float) -> Tuple[complex, complex]:
     return path.point(t), 50 * v / abs(v)
 
 # along line
-def along_line(rng: np.random.Generator, field: np.ndarray, p0: complex, p1: complex, v: complex) -> Tuple[complex, complex]:
+def along_line(rng: np.random.Generator, field: FieldSampler, n: int, p0: complex, p1: complex, v: complex) -> Tuple[np.ndarray, np.ndarray]:
     del field
-    t = rng.random()
-    return p0 * (1 - t) + p1 * t, v
-
-
-def sample_2d(rng: np.random.Generator, pdf: np.ndarray):
-    index = rng.choice(np.arange(pdf.size), p=pdf.ravel())
-    return np.unravel_index(index, pdf.shape)
+    t = rng.random(n)
+    return p0 * (1 - t) + p1 * t, np.full(n, v, dtype=complex)
 
 
-def as_pdf(field: np.ndarray):
-    lo = np.min(field)
-    hi = np.max(field)
-    pdf = hi - field  # reverse and move to zero
-    return pdf / np.sum(pdf)
-
-
-def to_size(c: complex, size: Tuple[float, float], resolution: Tuple[int, int]) -> complex:
-    return complex(
-        c.real * size[0] / resolution[0],
-        c.imag * size[1] / resolution[1],
-    )
+def to_size(c: np.ndarray, size: Tuple[float, float], resolution: Tuple[int, int]) -> np.ndarray:
+    return c.real * size[0] / resolution[0] + 1j * (c.imag * size[1] / resolution[1])
 
 def field_resolution(field: np.ndarray) -> Tuple[int, int]:
     width, height = field.shape
     return width, height
     
 
-def along_field(rng: np.random.Generator, field: np.ndarray, size: Tuple[float, float], v: float) -> Tuple[complex, complex]:
-    #p = cuniform(rng, size)
-    p = to_size(complex(*sample_2d(rng, pdf=as_pdf(field))), size, field_resolution(field))
+def along_field(rng: np.random.Generator, field: FieldSampler, n: int, size: Tuple[float, float], v: float) -> Tuple[np.ndarray, np.ndarray]:
+    #p = cuniform(rng, size, n)
+    rows, columns = field.distribution().sample(rng, n)
+    p = to_size(rows + 1j * columns, size, field_resolution(field.field))
     
-    #return p, rng.choice((-1, 1)) * v * -1j * gradient_at(field, size, p)
-    return p, v * -1j * gradient_at(field, size, p)
+    #return p, rng.choice((-1, 1)) * v * -1j * field.gradient(p)
+    return p, v * -1j * field.gradient(p)
 
 
-def everywhere(rng: np.random.Generator, field: np.ndarray, size: Tuple[float, float], v: complex) -> Tuple[complex, complex]:
+def everywhere(rng: np.random.Generator, field: FieldSampler, n: int, size: Tuple[float, float], v: complex) -> Tuple[np.ndarray, np.ndarray]:
     del field
-    return cuniform(rng, size), v
+    return cuniform(rng, size, n), np.full(n, v, dtype=complex)
 
 
-Spawn = Callable[[np.random.Generator, np.ndarray], Tuple[complex, complex]]
+Spawn = Callable[[np.random.Generator, FieldSampler, int], Tuple[np.ndarray, np.ndarray]]
+# either a static field or a function providing the field for a time
+Field = Union[FieldSampler, Callable[[float], FieldSampler]]
 T = TypeVar('T')
+class Keyframes(Generic[T]):
+    """Items keyed on start time, kept sorted for binary search"""
+    def __init__(self):
+        self.times = []  # type: List[float]
+        self.items = []  # type: List[T]
+
+    def add(self, item: T, t: float) -> None:
+        index = bisect_right(self.times, t)
+        self.times.insert(index, t)
+        self.items.insert(index, item)
+
+    def at(self, t: float) -> T:
+        """Returns the item with the latest start time not after t"""
+        index = bisect_right(self.times, t) - 1
+        if index < 0:
+            raise Exception(f'not found for time {t}')
+        return self.items[index]
+
+
+@dataclass
+class Snapshot:
+    """Timeline state resolved for a single time"""
+    t: float
+    rng: np.random.Generator
+    field: FieldSampler
+    spawner: Spawn
+    damping: float
+
+    def spawn(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns positions and velocities for n new particles"""
+        return self.spawner(self.rng, self.field, n)
+
+
 class Timeline:
     def __init__(self, rng: np.random.Generator):
         self.rng = rng
-        self.fields = []  # type: List[Tuple[float, np.ndarray]]
-        self.spawns = []  # type: List[Tuple[float, Spawn]]
-        self.dampings = []  # type: List[Tuple[float, float]]
+        self.fields = Keyframes()  # type: Keyframes[Field]
+        self.spawns = Keyframes()  # type: Keyframes[Spawn]
+        self.dampings = Keyframes()  # type: Keyframes[float]
 
-    def _first(self, items: List[Tuple[float, T]], t: float) -> T:
-        for start, item in items:
-            if t >= start:
-                return item
-        raise Exception(f'not found for time {t}')
-
-    def add(self, field: np.ndarray, t: float) -> None:
-        self.fields.append((t, field))
-        self.fields.sort(reverse=True)
+    def add(self, field: Field, t: float) -> None:
+        self.fields.add(field, t)
 
     def add_spawn(self, spawn: Spawn, t: float) -> None:
-        self.spawns.append((t, spawn))
-        self.spawns.sort(reverse=True)
+        self.spawns.add(spawn, t)
 
-    def field(self, t: float) -> np.ndarray:
-        """Returns the vector field at time t"""
-        return self._first(self.fields, t)
-    
-    def spawn(self, t: float) -> Tuple[complex, complex]:
-        spawn = self._first(self.spawns, t)
-        field = self.field(t)
-        return spawn(self.rng, field)
-        
     def add_damping(self, damping: float, t: float) -> None:
-        self.dampings.append((t, damping))
-        self.dampings.sort(reverse=True)
+        self.dampings.add(damping, t)
+
+    def at(self, t: float) -> Snapshot:
+        field = self.fields.at(t)
+        return Snapshot(
+            t=t,
+            rng=self.rng,
+            field=field if isinstance(field, FieldSampler) else field(t),
+            spawner=self.spawns.at(t),
+            damping=self.dampings.at(t),
+        )
+
+
+def step(particles: Particles, frame: Snapshot, size: Tuple[float, float], dt: float) -> None:
+    dv = frame.field.gradient(particles.position)
+    particles.update(-dv, dt)
+    particles.damp(frame.damping)
 
-    def damping(self, t: float) -> float:
-        return self._first(self.dampings, t)
+    #outside = ~is_inside((size[0] - 1, size[1] - 1), particles.position) | (inside.value(particles.position) > 0.5)
+    outside = ~is_inside((size[0] - 1, size[1] - 1), particles.position)
+    particles.retract(outside)
+    dead = outside & (particles.length == 0)
+    if np.any(dead):
+        with timing.stage('spawn'):
+            particles.respawn(dead, *frame.spawn(np.count_nonzero(dead)))
 
 
 def fit_to(path: Path, size: Tuple[float, float], padding_fraction: float=0) -> Path:
@@ -263,29 +221,40 @@ def fit_to(path: Path, size: Tuple[float, float], padding_fraction: float=0) ->
     #return transform(path, s, )
 
 
-def main():
-    N = 1024
-    LINE_WIDTH = 0.2
-    G = 300
-    dt = 0.025
-    size = (720, 720)
-    resolution = (400, 400)
-
+N = int(os.environ.get('PARTICLES', 1024))
+LINE_WIDTH = 0.2
+G = 300
+DT = 0.025
+DURATION = 20
+SIZE = (720, 720)
+FIELD_RESOLUTION = (400, 400)
+SEED = 1337
+# time-varying noise instead of the static noise field at the end
+FLOW = bool(os.environ.get('FLOW'))
+# directory to keep checkpoints in, none are kept when unset
+CHECKPOINT_DIRECTORY = os.environ.get('CHECKPOINTS')
+# frames between checkpoints
+CHECKPOINT_INTERVAL = int(os.environ.get('CHECKPOINT_INTERVAL', 80)) if CHECKPOINT_DIRECTORY else 0
+# files the simulation is built from, checkpoints are kept apart per content
+SIMULATION_SOURCES = ('main.py', 'checkpoint.py', 'geometry.py', 'particles.py', 'perlin.py', 'sampler.py', 'volumental.svg')
+
+
+def create_timeline(rng: np.random.Generator) -> Timeline:
+    size, resolution = SIZE, FIELD_RESOLUTION
     heart = fit_to(HEART, size, padding_fraction=0.5)
     volumental = fit_to(Path(*svg2paths('volumental.svg')[0]), size, padding_fraction=0.5)
     volumental = volumental.translated(complex(0, 0.25 * size[1]))  # workaround
 
-    rng = np.random.Generator(np.random.PCG64(1337))
     timeline = Timeline(rng)
     # start with side-ways lines over perlin field
-    perlin_noise = G * 15 * generate_perlin_noise_2d(resolution, (5, 5), rng)
+    perlin_noise = FieldSampler(G * 15 * generate_perlin_noise_2d(resolution, (5, 5), rng), size)
     timeline.add(perlin_noise, 0)
     timeline.add_spawn(partial(everywhere, size=size, v=200), 0)
     timeline.add_spawn(partial(along_line, p0=0, p1=1j*size[1], v=200), 0.1)
     timeline.add_damping(0, 0)
 
     # switch to volumental logo after 4 seconds
-    timeline.add(G * create_sdf(volumental, size, resolution, n=200), 4)
+    timeline.add(FieldSampler(G * create_sdf(volumental, size, resolution), size), 4)
     timeline.add_spawn(partial(along_field, size=size, v=0.051), 4)
     timeline.add_damping(0.010, 4)
 
@@ -293,41 +262,136 @@ def main():
     timeline.add_damping(0, 10)
 
     # switch to hearth after 10 seconds
-    timeline.add(G * create_sdf(heart, size, resolution, n=200), 12)
+    timeline.add(FieldSampler(G * create_sdf(heart, size, resolution), size), 12)
     timeline.add_spawn(partial(along_field, size=size, v=0.051), 12)
     timeline.add_damping(0.005, 12)
     
-    # and finally back to perlin noise
-    timeline.add(perlin_noise, 16)
-
+    # and finally back to perlin noise, evolving over time with FLOW set
+    if FLOW:
+        perlin_flow = PerlinNoise3D(resolution, (5, 5), seed=1337, frequency=0.5)
+        timeline.add(AnimatedField(lambda t: G * 15 * perlin_flow(t), size), 16)
+    else:
+        timeline.add(perlin_noise, 16)
+    return timeline
+
+
+def frame_times() -> np.ndarray:
+    return np.arange(0, DURATION, DT)
+
+
+def checkpoint_directory(root: str) -> str:
+    """Checkpoints are kept apart per simulation source and setting"""
+    key = digest(N, DT, G, DURATION, SIZE, FIELD_RESOLUTION, SEED, FLOW, np.__version__, *contents(SIMULATION_SOURCES))
+    return os.path.join(root, key[:16])
+
+
+class Simulation:
+    """The particles and timeline, stepped one frame at a time from any checkpoint"""
+    def __init__(self, directory: Optional[str]):
+        rng = np.random.Generator(np.random.PCG64(SEED))
+        self.timeline = create_timeline(rng)
+        self.particles = Particles(*self.timeline.at(0.0).spawn(N))
+        self.times = frame_times()
+        self.index = 0
+        # where checkpoints are kept, if anywhere
+        self.directory = directory
+
+    def resume(self, index: int) -> None:
+        """Continues from the last checkpoint at or before index, if any"""
+        if self.directory is None:
+            return
+        found = checkpoint.latest(self.directory, index)
+        if found and found[0] > self.index:
+            self.index, path = found
+            checkpoint.load(path, self.particles, self.timeline.rng)
+
+    def checkpoint(self) -> None:
+        checkpoint.save(self.directory, self.index, self.particles, self.timeline.rng)
+
+    def step(self) -> None:
+        if CHECKPOINT_INTERVAL and self.index % CHECKPOINT_INTERVAL == 0:
+            self.checkpoint()
+        with timing.stage('simulate'):
+            step(self.particles, self.timeline.at(self.times[self.index]), SIZE, DT)
+        self.index += 1
+
+    def advance(self, index: int) -> None:
+        """Steps up to index, without rendering"""
+        self.resume(index)
+        while self.index < index:
+            self.step()
+
+
+def render_frames(frames: BinaryIO, checkpoints: Optional[str], output_resolution: Tuple[int, int], start: int, stop: int, workers: int) -> None:
+    """Renders frames start..stop-1 to frames, resuming from a checkpoint when possible"""
+    # draw in output pixels, with lines as dark as at full size
+    scale = output_resolution[0] / SIZE[0]
+    #inside = create_inside_lookup(heart, size, output_resolution)
+
+    def render(surface: cairo.ImageSurface, segments: Segments) -> None:
+        with timing.stage('clear'):
+            clear(surface, (1, 1, 1))
+        a, b = segments
+        draw(surface, (a * scale, b * scale), (0, 0, 0), line_width=LINE_WIDTH * scale)
+
+    def write(surface: cairo.ImageSurface) -> None:
+        with timing.stage('write'):
+            frames.write(surface.get_data())
+        #frames.write(encode_frame(from_gray(frame)))
+
+    simulation = Simulation(checkpoints)
+    simulation.advance(start)
+    # simulate here, render on worker threads and write from a writer thread
+    surfaces = [cairo.ImageSurface(cairo.Format.ARGB32, *output_resolution) for _ in range(2 * workers + 2)]
+    with Pipeline(render, write, surfaces, workers) as pipeline:
+        for index in range(start, stop):
+            simulation.step()
+            # the simulation depends on every step, but only selected frames are drawn
+            if preview.selected(index, simulation.times[index]):
+                pipeline.submit(simulation.particles.segments())
+            timing.frame()
+
+
+def render_segment(path: str, checkpoints: str, output_resolution: Tuple[int, int], start: int, stop: int, workers: int) -> None:
+    with open(path, 'wb') as f:
+        render_frames(f, checkpoints, output_resolution, start, stop, workers)
 
-    dots = [Dot(*timeline.spawn(0.0)) for _ in range(N)]
 
+def main():
     #output_resolution = (400, 400)
-    output_resolution = (720, 720)
-    surface = cairo.ImageSurface(cairo.Format.ARGB32, *output_resolution)
-    for t in np.arange(0, 20, dt):
-        field = timeline.field(t)
-
-        # step
-        for dot in dots:
-            dv = gradient_at(field, size, dot.position)
-            dot.update(-dv, dt)
-            dot.damp(timeline.damping(t))
-            
-            #if not is_inside(resolution, dot.position) or at(inside, size, dot.position):
-            if not is_inside((size[0] - 1, size[1] - 1), dot.position):
-                dot.retract()
-                if not dot.trace:
-                    #print('spawning new line', file=sys.stderr)
-                    dot.respawn(*timeline.spawn(t))
-
-        clear(surface, (1, 1, 1))
-        draw(surface, dots, (0, 0, 0), line_width=LINE_WIDTH)
-        
-        sys.stdout.buffer.write(surface.get_data())
-        #sys.stdout.buffer.write(encode_frame(from_gray(frame)))
-        #sys.stdout.buffer.write(encode_frame(from_gray(autoscale(field))))
+    output_resolution = preview.scale(tuple(int(d) for d in os.environ.get('RESOLUTION', '720x720').split('x')))
+    start, stop = np.searchsorted(frame_times(), preview.WINDOW)
+    workers = os.cpu_count() or 1
+    segments = int(os.environ.get('SEGMENTS', 1))
+    if segments == 1:
+        checkpoints = checkpoint_directory(CHECKPOINT_DIRECTORY) if CHECKPOINT_DIRECTORY else None
+        with open_sink(output_resolution) as frames:
+            render_frames(frames, checkpoints, output_resolution, start, stop, workers)
+        return
+
+    frame_size = output_resolution[0] * output_resolution[1] * 4
+    with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(segments) as executor:
+        # simulate once up to each segment, leaving a checkpoint where it starts,
+        # kept along with the segment files unless CHECKPOINTS is set
+        checkpoints = checkpoint_directory(CHECKPOINT_DIRECTORY or directory)
+        bounds = np.linspace(start, stop, segments + 1).astype(int)
+        simulation = Simulation(checkpoints)
+        for bound in bounds[1:-1]:
+            simulation.advance(bound)
+            simulation.checkpoint()
+
+        # render segments in separate processes, and pass them on in order
+        paths = [os.path.join(directory, f'{i}.raw') for i in range(segments)]
+        futures = [
+            executor.submit(render_segment, path, checkpoints, output_resolution, a, b, max(1, workers // segments))
+            for path, a, b in zip(paths, bounds[:-1], bounds[1:])
+        ]
+        with open_sink(output_resolution) as frames:
+            for path, future in zip(paths, futures):
+                future.result()
+                with open(path, 'rb') as f:
+                    for frame in iter(lambda: f.read(frame_size), b''):
+                        frames.write(frame)
 
 
 if __name__ == "__main__":
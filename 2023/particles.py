@@ -0,0 +1,69 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class Particles:
+    """Structure-of-arrays particle system with a fixed length trace per particle.
+
+    Traces are kept in a ring buffer per particle, newest entry at head.
+    """
+    def __init__(self, positions: np.ndarray, velocities: np.ndarray, trace_length: int = 32):
+        n = len(positions)
+        self.position = np.array(positions, dtype=complex)
+        self.velocity = np.array(velocities, dtype=complex)
+        self.trace_position = np.zeros((n, trace_length), dtype=complex)
+        self.trace_velocity = np.zeros((n, trace_length), dtype=complex)
+        self.head = np.zeros(n, dtype=np.intp)
+        self.length = np.zeros(n, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.position)
+
+    def trace_length(self) -> int:
+        return self.trace_position.shape[1]
+
+    def update(self, acceleration: np.ndarray, dt: float) -> None:
+        self.head = (self.head + 1) % self.trace_length()
+        index = np.arange(len(self))
+        self.trace_position[index, self.head] = self.position
+        self.trace_velocity[index, self.head] = self.velocity
+        np.minimum(self.length + 1, self.trace_length(), out=self.length)
+
+        self.velocity += acceleration * dt
+        self.position += self.velocity * dt
+
+    def damp(self, damping: float) -> None:
+        self.velocity *= (1.0 - damping)
+
+    def retract(self, mask: np.ndarray) -> None:
+        """undoes last update for masked particles"""
+        index = np.flatnonzero(mask)
+        head = self.head[index]
+        self.position[index] = self.trace_position[index, head]
+        self.velocity[index] = self.trace_velocity[index, head]
+        self.head[index] = (head - 1) % self.trace_length()
+        # pop the newest entry and drop the oldest one, if any
+        self.length[index] = np.maximum(self.length[index] - 2, 0)
+
+    def respawn(self, mask: np.ndarray, positions: np.ndarray, velocities: np.ndarray) -> None:
+        self.length[mask] = 0
+        self.position[mask] = positions
+        self.velocity[mask] = velocities
+
+    def segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns start and end points of the line segments of all traces"""
+        offsets = (self.head[:, np.newaxis] - np.arange(self.trace_length())) % self.trace_length()
+        traces = np.take_along_axis(self.trace_position, offsets, axis=1)
+        valid = np.arange(1, self.trace_length()) < self.length[:, np.newaxis]
+        return traces[:, :-1][valid], traces[:, 1:][valid]
+
+    def trace(self, i: int) -> np.ndarray:
+        """Returns trace positions of particle i, newest first"""
+        offsets = (self.head[i] - np.arange(self.length[i])) % self.trace_length()
+        return self.trace_position[i, offsets]
+
+
+def is_inside(resolution: Tuple[float, float], p: np.ndarray) -> np.ndarray:
+    width, height = resolution
+    return (0 < p.real) & (p.real < width) & (0 < p.imag) & (p.imag < height)
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Tuple
+
 import numpy as np
 
 
@@ -5,11 +8,60 @@ def interpolant(t):
     return t*t*t*(t*(t*6 - 15) + 10)
 
 
+def perlin_gradients(res, rng: np.random.Generator, tileable=(False, False)) -> np.ndarray:
+    """Random unit gradients on the (res[0] + 1, res[1] + 1) lattice"""
+    angles = 2*np.pi*rng.random((res[0]+1, res[1]+1))
+    gradients = np.dstack((np.cos(angles), np.sin(angles)))
+    if tileable[0]:
+        gradients[-1,:] = gradients[0,:]
+    if tileable[1]:
+        gradients[:,-1] = gradients[:,0]
+    return gradients
+
+
+def perlin_rows(gradients, shape, res, start, stop, interpolant=interpolant, dtype=np.float64) -> np.ndarray:
+    """Generates rows start to stop of perlin noise from lattice gradients"""
+    delta = (dtype(res[0] / shape[0]), dtype(res[1] / shape[1]))
+    d = (shape[0] // res[0], shape[1] // res[1])
+    rows = np.arange(start, stop)
+    columns = np.arange(shape[1])
+    x = (rows.astype(dtype) * delta[0] % 1)[:, np.newaxis]
+    y = (columns.astype(dtype) * delta[1] % 1)[np.newaxis, :]
+    gradients = gradients.astype(dtype, copy=False)
+    i = (rows // d[0])[:, np.newaxis]
+    j = (columns // d[1])[np.newaxis, :]
+    g00 = gradients[i  , j  ]
+    g10 = gradients[i+1, j  ]
+    g01 = gradients[i  , j+1]
+    g11 = gradients[i+1, j+1]
+    # Ramps
+    n00 = x    *g00[..., 0] + y    *g00[..., 1]
+    n10 = (x-1)*g10[..., 0] + y    *g10[..., 1]
+    n01 = x    *g01[..., 0] + (y-1)*g01[..., 1]
+    n11 = (x-1)*g11[..., 0] + (y-1)*g11[..., 1]
+    # Interpolation
+    t0, t1 = interpolant(x), interpolant(y)
+    n0 = n00*(1-t0) + t0*n10
+    n1 = n01*(1-t0) + t0*n11
+    return dtype(np.sqrt(2))*((1-t1)*n0 + t1*n1)
+
+
+def chunks(shape, chunk_size):
+    """Splits the rows of shape into (start, stop) ranges of about chunk_size elements"""
+    rows = max(1, chunk_size // shape[1])
+    for start in range(0, shape[0], rows):
+        yield start, min(start + rows, shape[0])
+
+
 def generate_perlin_noise_2d(
-        shape, res, rng:np.random.Generator, tileable=(False, False),interpolant=interpolant
+        shape, res, rng:np.random.Generator, tileable=(False, False),interpolant=interpolant,
+        dtype=np.float64, out=None, chunk_size=1 << 16,
 ):
     """Generate a 2D numpy array of perlin noise.
 
+    The noise is generated a few rows at a time, so no temporaries larger
+    than chunk_size elements are allocated.
+
     Args:
         shape: The shape of the generated array (tuple of two ints).
             This must be a multple of res.
@@ -20,6 +72,9 @@ def generate_perlin_noise_2d(
             (tuple of two bools). Defaults to (False, False).
         interpolant: The interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        dtype: The dtype of the generated noise, float32 or float64.
+        out: Optional preallocated array of shape shape to write to.
+        chunk_size: The approximate number of elements per chunk.
 
     Returns:
         A numpy array of shape shape with the generated noise.
@@ -27,41 +82,26 @@ def generate_perlin_noise_2d(
     Raises:
         ValueError: If shape is not a multiple of res.
     """
-    delta = (res[0] / shape[0], res[1] / shape[1])
-    d = (shape[0] // res[0], shape[1] // res[1])
-    grid = np.mgrid[0:res[0]:delta[0], 0:res[1]:delta[1]]\
-             .transpose(1, 2, 0) % 1
-    # Gradients
-    angles = 2*np.pi*rng.random((res[0]+1, res[1]+1))
-    gradients = np.dstack((np.cos(angles), np.sin(angles)))
-    if tileable[0]:
-        gradients[-1,:] = gradients[0,:]
-    if tileable[1]:
-        gradients[:,-1] = gradients[:,0]
-    gradients = gradients.repeat(d[0], 0).repeat(d[1], 1)
-    g00 = gradients[    :-d[0],    :-d[1]]
-    g10 = gradients[d[0]:     ,    :-d[1]]
-    g01 = gradients[    :-d[0],d[1]:     ]
-    g11 = gradients[d[0]:     ,d[1]:     ]
-    # Ramps
-    n00 = np.sum(np.dstack((grid[:,:,0]  , grid[:,:,1]  )) * g00, 2)
-    n10 = np.sum(np.dstack((grid[:,:,0]-1, grid[:,:,1]  )) * g10, 2)
-    n01 = np.sum(np.dstack((grid[:,:,0]  , grid[:,:,1]-1)) * g01, 2)
-    n11 = np.sum(np.dstack((grid[:,:,0]-1, grid[:,:,1]-1)) * g11, 2)
-    # Interpolation
-    t = interpolant(grid)
-    n0 = n00*(1-t[:,:,0]) + t[:,:,0]*n10
-    n1 = n01*(1-t[:,:,0]) + t[:,:,0]*n11
-    return np.sqrt(2)*((1-t[:,:,1])*n0 + t[:,:,1]*n1)
+    if shape[0] % res[0] or shape[1] % res[1]:
+        raise ValueError(f'shape {shape} is not a multiple of res {res}')
+    gradients = perlin_gradients(res, rng, tileable)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    for start, stop in chunks(shape, chunk_size):
+        out[start:stop] = perlin_rows(gradients, shape, res, start, stop, interpolant, dtype)
+    return out
 
 
 def generate_fractal_noise_2d(
-        shape, res, octaves=1, persistence=0.5,
+        shape, res, rng:np.random.Generator, octaves=1, persistence=0.5,
         lacunarity=2, tileable=(False, False),
-        interpolant=interpolant
+        interpolant=interpolant, dtype=np.float64, out=None, chunk_size=1 << 16,
 ):
     """Generate a 2D numpy array of fractal noise.
 
+    All octaves are accumulated a few rows at a time into the output, so no
+    temporaries larger than chunk_size elements are allocated.
+
     Args:
         shape: The shape of the generated array (tuple of two ints).
             This must be a multiple of lacunarity**(octaves-1)*res.
@@ -75,6 +115,9 @@ def generate_fractal_noise_2d(
             (tuple of two bools). Defaults to (False, False).
         interpolant: The, interpolation function, defaults to
             t*t*t*(t*(t*6 - 15) + 10).
+        dtype: The dtype of the generated noise, float32 or float64.
+        out: Optional preallocated array of shape shape to write to.
+        chunk_size: The approximate number of elements per chunk.
 
     Returns:
         A numpy array of fractal noise and of shape shape generated by
@@ -84,13 +127,75 @@ def generate_fractal_noise_2d(
         ValueError: If shape is not a multiple of
             (lacunarity**(octaves-1)*res).
     """
-    noise = np.zeros(shape)
-    frequency = 1
-    amplitude = 1
-    for _ in range(octaves):
-        noise += amplitude * generate_perlin_noise_2d(
-            shape, (frequency*res[0], frequency*res[1]), tileable, interpolant
-        )
-        frequency *= lacunarity
-        amplitude *= persistence
-    return noise
\ No newline at end of file
+    octave_res = [(lacunarity**i*res[0], lacunarity**i*res[1]) for i in range(octaves)]
+    if shape[0] % octave_res[-1][0] or shape[1] % octave_res[-1][1]:
+        raise ValueError(f'shape {shape} is not a multiple of res {octave_res[-1]}')
+    lattices = [perlin_gradients(r, rng, tileable) for r in octave_res]
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    for start, stop in chunks(shape, chunk_size):
+        out[start:stop] = 0
+        amplitude = 1
+        for gradients, r in zip(lattices, octave_res):
+            out[start:stop] += dtype(amplitude) * perlin_rows(gradients, shape, r, start, stop, interpolant, dtype)
+            amplitude *= persistence
+    return out
+
+
+@lru_cache(maxsize=8)
+def lattice_gradients(seed: int, res: Tuple[int, int], layer: int) -> np.ndarray:
+    """Random unit gradients for one integer time layer of the 3D lattice"""
+    rng = np.random.Generator(np.random.PCG64([seed, layer]))
+    gradients = rng.standard_normal((res[0] + 1, res[1] + 1, 3))
+    return gradients / np.linalg.norm(gradients, axis=-1, keepdims=True)
+
+
+class PerlinNoise3D:
+    """Perlin noise over (x, y, t) that is generated one time slice at a time.
+
+    The gradients of each time layer are derived from the seed and the layer
+    index, so slices can be generated for any t and in any order.
+
+    Args:
+        shape: The shape of each slice (tuple of two ints).
+        res: The number of periods of noise along each axis of a slice
+            (tuple of two ints).
+        seed: Seed for the lattice gradients.
+        frequency: Periods of noise per unit of time.
+        dtype: The dtype of the generated slices.
+        interpolant: The interpolation function, defaults to
+            t*t*t*(t*(t*6 - 15) + 10).
+    """
+    def __init__(self, shape, res, seed: int, frequency: float = 1.0, dtype=np.float32, interpolant=interpolant):
+        self.shape = shape
+        self.res = res
+        self.seed = seed
+        self.frequency = frequency
+        self.dtype = dtype
+        self.interpolant = interpolant
+
+    def __call__(self, t: float) -> np.ndarray:
+        """Generates the slice of noise at time t"""
+        u = np.arange(self.shape[0], dtype=self.dtype) * self.dtype(self.res[0] / self.shape[0])
+        v = np.arange(self.shape[1], dtype=self.dtype) * self.dtype(self.res[1] / self.shape[1])
+        fu, fv = (u % 1)[:, np.newaxis], (v % 1)[np.newaxis, :]
+        iu, iv = u.astype(int), v.astype(int)
+        w = t * self.frequency
+        layer = int(np.floor(w))
+        fw = self.dtype(w - layer)
+
+        # dot products of gradients and offsets for the eight corners
+        n = np.empty((2, 2, 2) + tuple(self.shape), dtype=self.dtype)
+        for c in range(2):
+            gradients = lattice_gradients(self.seed, tuple(self.res), layer + c).astype(self.dtype)
+            for a in range(2):
+                for b in range(2):
+                    g = gradients[(iu + a)[:, np.newaxis], (iv + b)[np.newaxis, :]]
+                    n[a, b, c] = g[..., 0] * (fu - a) + g[..., 1] * (fv - b) + g[..., 2] * (fw - c)
+
+        # interpolation
+        tu, tv, tw = self.interpolant(fu), self.interpolant(fv), self.interpolant(fw)
+        n = n[0] + tu * (n[1] - n[0])
+        n = n[0] + tv * (n[1] - n[0])
+        n = n[0] + tw * (n[1] - n[0])
+        return self.dtype(2 / np.sqrt(3)) * n
@@ -0,0 +1,70 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
+from typing import Callable, Generic, Optional, Sequence, Tuple, TypeVar
+
+
+B = TypeVar('B')
+S = TypeVar('S')
+
+
+class Pipeline(Generic[B, S]):
+    """Renders snapshots on worker threads and writes them in order from a writer thread.
+
+    Frame buffers are recycled through a pool, which also bounds how far the
+    producer can run ahead of the writer.
+    """
+    def __init__(
+            self,
+            render: Callable[[B, S], None],
+            write: Callable[[B], None],
+            buffers: Sequence[B],
+            workers: int = 1,
+    ):
+        self.render = render
+        self.write = write
+        self.free = Queue()  # type: Queue[B]
+        for buffer in buffers:
+            self.free.put(buffer)
+        # frames being rendered in submission order, None marks the end
+        self.pending = Queue()  # type: Queue[Optional[Tuple[B, Future[None]]]]
+        self.error = None  # type: Optional[BaseException]
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.writer = Thread(target=self._drain, daemon=True)
+        self.writer.start()
+
+    def _drain(self) -> None:
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            buffer, future = item
+            try:
+                future.result()
+                if self.error is None:
+                    self.write(buffer)
+            except BaseException as e:
+                self.error = self.error or e
+            # the buffer is returned even after an error so submit never blocks
+            self.free.put(buffer)
+
+    def submit(self, snapshot: S) -> None:
+        """Queues a snapshot for rendering, blocks while all buffers are in use"""
+        if self.error:
+            raise self.error
+        buffer = self.free.get()
+        self.pending.put((buffer, self.executor.submit(self.render, buffer, snapshot)))
+
+    def close(self) -> None:
+        """Waits for all frames to be written"""
+        self.pending.put(None)
+        self.writer.join()
+        self.executor.shutdown()
+        if self.error:
+            raise self.error
+
+    def __enter__(self) -> 'Pipeline[B, S]':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
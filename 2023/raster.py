@@ -0,0 +1,59 @@
+from typing import Tuple
+
+import numpy as np
+
+
+Color = Tuple[float, float, float]
+
+
+def splat(total: np.ndarray, a: np.ndarray, b: np.ndarray, line_width: float, spacing: float) -> None:
+    height, width = total.shape
+    lengths = np.abs(b - a)
+    counts = np.ceil(lengths / spacing).astype(int) + 1
+    index = np.repeat(np.arange(len(a)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    t = (np.arange(index.size) - first + 0.5) / counts[index]
+    p = a[index] + t * (b - a)[index]
+    weight = line_width * lengths[index] / counts[index]
+
+    # pixel centers are at half integers
+    x, y = p.real - 0.5, p.imag - 0.5
+    x0, y0 = np.floor(x).astype(int), np.floor(y).astype(int)
+    fx, fy = x - x0, y - y0
+    xi = np.concatenate([x0, x0 + 1, x0, x0 + 1])
+    yi = np.concatenate([y0, y0, y0 + 1, y0 + 1])
+    w = np.concatenate([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy]) * np.tile(weight, 4)
+    inside = (0 <= xi) & (xi < width) & (0 <= yi) & (yi < height)
+    total += np.bincount(
+        (yi * width + xi)[inside],
+        weights=w[inside],
+        minlength=total.size,
+    ).reshape(total.shape)
+
+
+def coverage(
+        a: np.ndarray,
+        b: np.ndarray,
+        line_width: float,
+        resolution: Tuple[int, int],
+        spacing: float = 1.0,
+        chunk: int = 1 << 16,
+) -> np.ndarray:
+    """Approximate area of each pixel covered by thin line segments a-b.
+
+    Each segment is sampled at most spacing pixels apart and every sample
+    splats its share of the line area onto the four nearest pixel centers.
+    """
+    width, height = resolution
+    total = np.zeros((height, width))
+    for lo in range(0, len(a), chunk):
+        splat(total, a[lo:lo + chunk], b[lo:lo + chunk], line_width, spacing)
+    return total
+
+
+def composite(pixels: np.ndarray, alpha: np.ndarray, color: Color) -> None:
+    """Blends color over opaque BGRA pixels in place"""
+    r, g, b = color
+    bgr = 255 * np.array([b, g, r])
+    alpha = alpha[..., np.newaxis]
+    pixels[..., :3] = np.rint(pixels[..., :3] * (1 - alpha) + bgr * alpha)
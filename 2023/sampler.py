@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+def bilinear(grid: np.ndarray, size: Tuple[float, float], p: np.ndarray) -> np.ndarray:
+    """Samples grid at positions p (x + yi) with bilinear interpolation, clamping at the edges"""
+    height, width = grid.shape
+    x = np.clip(np.asarray(p.real) * width / size[0], 0, width - 1)
+    y = np.clip(np.asarray(p.imag) * height / size[1], 0, height - 1)
+    x0 = np.minimum(x.astype(int), width - 2)
+    y0 = np.minimum(y.astype(int), height - 2)
+    fx, fy = x - x0, y - y0
+    top = grid[y0, x0] * (1 - fx) + grid[y0, x0 + 1] * fx
+    bottom = grid[y0 + 1, x0] * (1 - fx) + grid[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def as_pdf(field: np.ndarray) -> np.ndarray:
+    pdf = np.max(field) - field  # reverse and move to zero
+    return pdf / np.sum(pdf)
+
+
+class Distribution:
+    """Draws grid indices with probability pdf, by binary search in the precomputed cdf"""
+    def __init__(self, pdf: np.ndarray):
+        self.shape = pdf.shape
+        self.cdf = np.cumsum(pdf.ravel())
+        self.cdf /= self.cdf[-1]
+
+    def sample(self, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        index = self.cdf.searchsorted(rng.random(n), side='right')
+        return np.unravel_index(index, self.shape)
+
+
+class FieldSampler:
+    """Owns a scalar field covering size and its precomputed gradient.
+
+    The gradient is computed once on construction. Call invalidate() if the
+    field is modified in place.
+    """
+    def __init__(self, field: np.ndarray, size: Tuple[float, float]):
+        self.field = field
+        self.size = size
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        dy, dx = np.gradient(self.field)
+        self._gradient = dx + 1j * dy
+        self._distribution = None  # type: Optional[Distribution]
+
+    def resolution(self) -> Tuple[int, int]:
+        height, width = self.field.shape
+        return width, height
+
+    def value(self, p: np.ndarray) -> np.ndarray:
+        return bilinear(self.field, self.size, p)
+
+    def gradient(self, p: np.ndarray) -> np.ndarray:
+        """gradient of the field at positions p as complex (x + yi) values"""
+        return bilinear(self._gradient, self.size, p)
+
+    def distribution(self) -> Distribution:
+        """Distribution favouring low values of the field, built on first use"""
+        if self._distribution is None:
+            self._distribution = Distribution(as_pdf(self.field))
+        return self._distribution
+
+
+class AnimatedField:
+    """Provides a FieldSampler for any time from a field generating function.
+
+    Time is rounded to whole multiples of quantum, so the field changes in
+    steps and frames within the same step share one generated slice. The
+    most recent slices and their gradients are kept in a small LRU cache.
+    """
+    def __init__(self, generate: Callable[[float], np.ndarray], size: Tuple[float, float], quantum: float = 0.1, cache_size: int = 4):
+        self.generate = generate
+        self.size = size
+        self.quantum = quantum
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # type: OrderedDict[int, FieldSampler]
+
+    def __call__(self, t: float) -> FieldSampler:
+        step = round(t / self.quantum)
+        if step in self.cache:
+            self.cache.move_to_end(step)
+            return self.cache[step]
+        sampler = FieldSampler(self.generate(step * self.quantum), self.size)
+        self.cache[step] = sampler
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return sampler
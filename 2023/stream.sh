@@ -1,3 +1,7 @@
 #!/bin/sh
 RESOLUTION=${RESOLUTION:-720x720} 
+# previews render at 1/PREVIEW of the resolution
+if [ -n "$PREVIEW" ]; then
+    RESOLUTION=$((${RESOLUTION%x*} / PREVIEW))x$((${RESOLUTION#*x} / PREVIEW))
+fi
 ffplay -v warning -loop 0 -f rawvideo -pixel_format rgb32 -framerate 30 -video_size $RESOLUTION -i -
@@ -1,25 +1,47 @@
 import os
-import sys
 import math
 import random
-from typing import BinaryIO, Iterable, List, Optional, Union
+import sys
+from typing import BinaryIO, List, Optional, Tuple, Union
 
 import cairo
 import numpy as np
 from PIL import Image
+import shapely
 from shapely import Polygon, MultiPolygon, transform
 
+# the modules shared between the years live in common next to them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import sink, timing
+from common.digest import contents, digest
 from valentine import color
 from valentine.resolution import Resolution, parse_resolution
 import valentine.zoom
 import valentine.svg
 from valentine.tween import EaseInQuad, EaseOutQuad, Timeline, Linear, Constant, TweenSequence
 from valentine import tony
+from valentine import cache
+from valentine import parallel
+from valentine import preview
+from valentine.blur import MotionBlur
 
 
 TAU = 2 * math.pi
 #MOTION_BLUR = {'n': 8, 'dt': 0.05*1/60}
 MOTION_BLUR = {'n': 1, 'dt': 0.05*1/60}
+if preview.ENABLED:
+    # no motion blur in previews
+    MOTION_BLUR = {'n': 1, 'dt': 0}
+CACHE_DIRECTORY = os.environ.get('CACHE_DIRECTORY', '.cache')
+# files the pieces are cut from, cached pieces are kept apart per content
+PIECES_SOURCES = ('main.py', 'valentine/svg.py', 'valentine/tony.py', 'valentine/zoom.py', 'valentine/cache.py', 'volumental.svg', 'heart.svg')
+PIECES = {
+    'grid': parse_resolution(os.environ.get('GRID', '7x7')),
+    'value': 0.6,
+    'seed': 0xdeadbeef9,
+    'shatter': os.environ.get('SHATTER', 'lines'),
+}
+#PIECES = {'grid': (64, 64), 'value': 0.8, 'seed': 0xdeadbeef9, 'shatter': 'voronoi'}
 
 
 def from_cairo(surface: cairo.ImageSurface) -> Image:
@@ -51,6 +73,13 @@ def draw_polygon(ctx: cairo.Context, polygon: Union[Polygon, MultiPolygon]) -> N
     ctx.close_path()
 
 
+def compile_path(polygon: Union[Polygon, MultiPolygon]) -> cairo.Path:
+    """Builds the path of polygon once, so it can be replayed with append_path under any transform"""
+    ctx = cairo.Context(cairo.RecordingSurface(cairo.CONTENT_ALPHA, None))
+    draw_polygon(ctx, polygon)
+    return ctx.copy_path()
+
+
 def lerp(a: float, b: float, t: float) -> float:
     return (1 - t) * a + t * b
 
@@ -65,94 +94,141 @@ def phase(rng: float) -> float:
     return ease_in_quad(rng) * 3
 
 
-def draw(
+class Scene:
+    """Logo and heart pieces with everything draw needs that does not change between frames"""
+    def __init__(self, rngs: np.ndarray, logo: List[Polygon], heart: List[Polygon]):
+        assert len(logo) == len(heart)
+        self.phases = phase(np.asarray(rngs))
+        self.logo_paths = [compile_path(piece) for piece in logo]
+        self.heart_paths = [compile_path(piece) for piece in heart]
+        self.logo_empty = np.array([piece.is_empty for piece in logo])
+        self.heart_empty = np.array([piece.is_empty for piece in heart])
+        self.logo_area = np.array([piece.area for piece in logo])
+        self.heart_area = np.array([piece.area for piece in heart])
+        self.area = np.mean(np.concatenate([self.logo_area[~self.logo_empty], self.heart_area[~self.heart_empty]]))
+        self.logo_center = np.array([(0, 0) if piece.is_empty else piece.centroid.coords[0] for piece in logo])
+        self.heart_center = np.array([(0, 0) if piece.is_empty else piece.centroid.coords[0] for piece in heart])
+
+
+def draw_piece(ctx: cairo.Context, camera: cairo.Matrix, path: cairo.Path, center: np.ndarray, y: float, angle: float) -> None:
+    ctx.set_matrix(camera)
+    ctx.translate(0, y)
+    # rotate around center
+    cx, cy = center
+    ctx.translate(cx, cy)
+    ctx.rotate(angle)
+    ctx.translate(-cx, -cy)
+    ctx.append_path(path)
+    ctx.fill()
+
+
+class Pose:
+    """Where every piece is at time t, and how much the camera shakes"""
+    def __init__(self, timeline: Timeline, scene: Scene, t: float):
+        self.t = t
+        ts = t + scene.phases
+        # compute camera shake amplitude
+        heart_amplitude = np.sum(scene.heart_area * timeline.tag('heart.shake')(ts)) / scene.area
+        logo_amplitude = np.sum(scene.logo_area * timeline.tag('logo.shake')(ts)) / scene.area
+        self.amplitude = 1.5 * (heart_amplitude + logo_amplitude)
+
+        ts = ts % timeline.duration()
+        self.heart_y = timeline.tag('heart.y')(ts)
+        self.logo_y = timeline.tag('logo.y')(ts)
+        # pieces in constant parts of their timeline, which do not move around t
+        self.heart_rest = timeline.tag('heart.y').constant(ts)
+        self.logo_rest = timeline.tag('logo.y').constant(ts)
+
+    def key(self) -> bytes:
+        """Equal keys draw identical images"""
+        # without shake the camera does not depend on t
+        shake = np.array([self.t, self.amplitude]) if self.amplitude else np.zeros(0)
+        return b''.join(a.tobytes() for a in (shake, self.heart_y, self.logo_y))
+
+
+def draw_pose(
     target: cairo.ImageSurface,
     foreground: cairo.Pattern,
-    timeline: Timeline,
-    rngs: List[float],
-    logo: List[Polygon],
-    heart: List[Polygon],
-    t: float,
+    scene: Scene,
+    pose: Pose,
+    heart_mask: Optional[np.ndarray] = None,
+    logo_mask: Optional[np.ndarray] = None,
 ) -> None:
-    assert len(logo) == len(heart)
+    """Draws the pieces selected by the masks, all of them by default"""
     camera = cairo.Matrix()
     ctx = cairo.Context(target)
     ctx.set_source(foreground)
 
-    area = np.mean([geom.area for geom in logo + heart if not geom.is_empty])
-        
-    # compute camera shake amplitude
-    heart_amplitude = sum(polygon.area * timeline.tag('heart.shake')(t + phase(rng)) / area for rng, polygon in zip(rngs, heart))
-    logo_amplitude = sum(polygon.area * timeline.tag('logo.shake')(t + phase(rng)) / area for rng, polygon in zip(rngs, logo))
-    amplitude = 1.5 * (heart_amplitude + logo_amplitude)
+    amplitude = pose.amplitude
     # use time as shake phase
-    theta = t * 1337
+    theta = pose.t * 1337
     
     camera.translate(target.get_width() / 2, target.get_height() / 2)
     camera.translate(math.cos(theta) * amplitude, math.sin(theta) * amplitude)
     camera.rotate(math.sin(amplitude*100) * 0.01)
     camera.translate(-target.get_width() / 2, -target.get_height() / 2)
 
-    for rng, logo_piece, heart_piece in zip(rngs, logo, heart):
-        # draw heart piece
-        if not heart_piece.is_empty:
-            y = timeline.tag('heart.y')((t + phase(rng)) % timeline.duration())
-            ctx.set_matrix(camera)
-            ctx.translate(0, y)
-            # rotate around center
-            center = heart_piece.centroid
-            ctx.translate(center.x, center.y)
-            ctx.rotate(y / 200)
-            ctx.translate(-center.x, -center.y)
-            draw_polygon(ctx, heart_piece)
-            ctx.fill()
-
-        # draw logo piece
-        if not logo_piece.is_empty:
-            ctx.set_matrix(camera)
-            y = timeline.tag('logo.y')((t + phase(rng)) % timeline.duration())
-            ctx.translate(0, y)
-            # rotate around center
-            center = logo_piece.centroid
-            ctx.translate(center.x, center.y)
-            ctx.rotate(-y / 200)
-            ctx.translate(-center.x, -center.y)
-
-            draw_polygon(ctx, logo_piece)
-            ctx.fill()
+    heart = ~scene.heart_empty if heart_mask is None else heart_mask & ~scene.heart_empty
+    logo = ~scene.logo_empty if logo_mask is None else logo_mask & ~scene.logo_empty
+    heart_angle = pose.heart_y / 200
+    logo_angle = -pose.logo_y / 200
+    for i in range(len(scene.phases)):
+        if heart[i]:
+            draw_piece(ctx, camera, scene.heart_paths[i], scene.heart_center[i], pose.heart_y[i], heart_angle[i])
+        if logo[i]:
+            draw_piece(ctx, camera, scene.logo_paths[i], scene.logo_center[i], pose.logo_y[i], logo_angle[i])
+
+
+def draw(
+    target: cairo.ImageSurface,
+    foreground: cairo.Pattern,
+    timeline: Timeline,
+    scene: Scene,
+    t: float,
+) -> None:
+    draw_pose(target, foreground, scene, Pose(timeline, scene, t))
 
 
 def load_svg(path: str, resolution: Resolution) -> MultiPolygon:
     """Loads path, converts to polygon(s) and translates/scales to resolution"""
-    polygons = valentine.svg.load(path)
+    polygons = valentine.svg.load(path, size=resolution)
     zoom = valentine.zoom.zoom_to(polygons.bounds, resolution, padding=64)
     return transform(polygons, zoom.transform)
 
 
 def as_array(surface: cairo.ImageSurface) -> np.ndarray:
+    """View of the pixels of surface, without copying"""
+    surface.flush()
     width, height = surface.get_width(), surface.get_height()
     return np.ndarray(
         shape=(height, width, 4),
         dtype=np.uint8,
         buffer=surface.get_data(),
-    ).copy()
+    )
 
 
-def motion_blur(frames: Iterable[np.ndarray]) -> np.ndarray:
-    array = np.stack([frame.astype(np.uint32) for frame in frames], axis=-1)
-    return np.mean(array, axis=-1).astype(np.uint8)
-
-
-def animate(f: BinaryIO, resolution: Resolution, dt: float):        
+def create_pieces(resolution: Resolution, grid: Resolution, value: float, seed: int, shatter: str) -> cache.Entry:
+    """Cuts logo and heart into pieces, and draws a random value for each location"""
+    rnd = random.Random(seed)
     # cut polygons, first create templates
-    random.seed(0xdeadbeef9)
-    grid = (7, 7)
-    templates = tony.create_templates(resolution, grid, value=0.6)
+    templates = tony.TEMPLATES[shatter](resolution, grid, value=value, rnd=rnd)
 
     logo = tony.cut(load_svg('volumental.svg', resolution), templates)
     heart = tony.cut(load_svg('heart.svg', resolution), templates)
 
-    # create timeline for pieces
+    # each location has a random value called "rng" for it's properties
+    rngs = np.array([rnd.random() for _ in range(len(templates.geoms))])
+    return {'logo': logo, 'heart': heart, 'rngs': rngs}
+
+
+def load_pieces(resolution: Resolution, grid: Resolution, value: float, seed: int, shatter: str) -> cache.Entry:
+    """Loads pieces from the geometry cache, cutting them on a miss"""
+    versions = shapely.__version__, shapely.geos_version_string, np.__version__
+    key = digest(*versions, *contents(PIECES_SOURCES), resolution, grid, value, seed, shatter)
+    return cache.cached(CACHE_DIRECTORY, key, lambda: create_pieces(resolution, grid, value, seed, shatter))
+
+
+def create_timeline(resolution: Resolution, dt: float) -> Timeline:
     timeline = Timeline()
     _, height = resolution
     timeline.add('heart.y', TweenSequence([
@@ -179,45 +255,139 @@ def animate(f: BinaryIO, resolution: Resolution, dt: float):
         EaseInQuad(1, 0, duration=dt * 3),  # shake for n frames
         Constant(0, duration=1),
     ]))
+    return timeline
 
-    # each location has a random value called "rng" for it's properties
-    rngs = [random.random() for _ in range(tony.area(grid))]
 
-    width, height = resolution
-    surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-
-    # foreground
-    # https://uigradients.com/#PurpleLove
-    foreground = color.gradient(resolution, ['#cc2b5e', '#753a88'])
-
-    # https://uigradients.com/#Clouds
-    background = color.gradient(resolution, ['#ECE9E6', '#FFFFFF'])
-
-    # thumb
-    #clear(surface, background)
-    #draw(surface, foreground, timeline, phases, logo, heart, t=2.8)
-    #surface.write_to_png('debug.png')
-    
+def frame_times(duration: float, dt: float) -> List[float]:
+    """Time of each frame, accumulated like a render loop would so every process agrees"""
+    times = []
     t = 0
-    duration = timeline.duration()
     while t < duration:
-        clear(surface, background)
-        frames = []
-        for i in range(MOTION_BLUR['n']):
-            draw(surface, foreground, timeline, rngs, logo, heart, t - i * MOTION_BLUR['dt'])
-            frames.append(as_array(surface))
-        buffer = motion_blur(frames).tobytes()
-        
-        #draw(surface, foreground, timeline, rngs, logo, heart, t)
-        #buffer = surface.get_data()
-    
-        f.write(buffer)
+        times.append(t)
         t += dt
+    return times
+
+
+class Renderer:
+    """Renders frames at any time, everything fixed after setup is created once"""
+    def __init__(self, resolution: Resolution, dt: float):
+        pieces = load_pieces(resolution, **PIECES)
+        self.scene = Scene(pieces['rngs'], pieces['logo'], pieces['heart'])
+        self.timeline = create_timeline(resolution, dt)
+
+        width, height = resolution
+        self.surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        self.blur = MotionBlur((height, width, 4), MOTION_BLUR['n'])
+        # background with the pieces at rest, redrawn when they change
+        self.static = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        self.static_key = None  # type: Optional[bytes]
+        self.frame_key = None  # type: Optional[bytes]
+
+        # foreground
+        # https://uigradients.com/#PurpleLove
+        self.foreground = color.gradient(resolution, ['#cc2b5e', '#753a88'])
+
+        # https://uigradients.com/#Clouds
+        self.background = color.gradient(resolution, ['#ECE9E6', '#FFFFFF'])
+
+        # thumb
+        #clear(self.surface, self.background)
+        #draw(self.surface, self.foreground, self.timeline, self.scene, t=2.8)
+        #self.surface.write_to_png('debug.png')
+
+    def update_static(self, poses: List[Pose]) -> Tuple[np.ndarray, np.ndarray]:
+        """Redraws the static layer if the pieces resting in poses differ from last time.
+
+        Returns which heart and logo pieces are in the static layer.
+        """
+        if any(pose.amplitude for pose in poses):
+            # camera shake moves everything
+            heart_rest = np.zeros(len(self.scene.phases), dtype=bool)
+            logo_rest = np.zeros(len(self.scene.phases), dtype=bool)
+        else:
+            first = poses[0]
+            heart_rest = np.logical_and.reduce([pose.heart_rest & (pose.heart_y == first.heart_y) for pose in poses])
+            logo_rest = np.logical_and.reduce([pose.logo_rest & (pose.logo_y == first.logo_y) for pose in poses])
+
+        key = b''.join(a.tobytes() for a in (heart_rest, logo_rest, poses[0].heart_y[heart_rest], poses[0].logo_y[logo_rest]))
+        if key != self.static_key:
+            clear(self.static, self.background)
+            draw_pose(self.static, self.foreground, self.scene, poses[0], heart_rest, logo_rest)
+            self.static_key = key
+        return heart_rest, logo_rest
+
+    def render(self, t: float) -> np.ndarray:
+        """Renders frame at t into a buffer that is reused by the next call"""
+        with timing.stage('simulate'):
+            poses = [Pose(self.timeline, self.scene, t - i * MOTION_BLUR['dt']) for i in range(MOTION_BLUR['n'])]
+            key = b''.join(pose.key() for pose in poses)
+        if key == self.frame_key:
+            # nothing moved since the previous frame
+            return self.blur.frame
+        self.frame_key = key
+
+        with timing.stage('composite'):
+            heart_rest, logo_rest = self.update_static(poses)
+            ctx = cairo.Context(self.surface)
+            ctx.set_source_surface(self.static)
+            ctx.set_operator(cairo.OPERATOR_SOURCE)
+            ctx.paint()
+        self.blur.clear()
+        for pose in poses:
+            with timing.stage('draw'):
+                draw_pose(self.surface, self.foreground, self.scene, pose, ~heart_rest, ~logo_rest)
+            with timing.stage('blur'):
+                self.blur.add(as_array(self.surface))
+        with timing.stage('blur'):
+            buffer = self.blur.result()
+
+        #draw(self.surface, self.foreground, self.timeline, self.scene, t)
+        #buffer = as_array(self.surface)
+        return buffer
+
+
+# renderer of each worker process
+_renderer = None  # type: Optional[Renderer]
+
+
+def _init_worker(resolution: Resolution, dt: float) -> None:
+    global _renderer
+    _renderer = Renderer(resolution, dt)
+
+
+def _render_frame(t: float) -> bytes:
+    buffer = _renderer.render(t)
+    with timing.stage('convert'):
+        data = buffer.tobytes()
+    timing.frame()
+    return data
+
+
+def animate(f: BinaryIO, resolution: Resolution, dt: float, workers: int = 1):
+    times = preview.select(frame_times(create_timeline(resolution, dt).duration(), dt))
+    if workers == 1:
+        renderer = Renderer(resolution, dt)
+        for t in times:
+            buffer = renderer.render(t)
+            with timing.stage('write'):
+                f.write(buffer)
+            timing.frame()
+        return
+
+    # cut the pieces once here, instead of in every worker on a cold cache
+    load_pieces(resolution, **PIECES)
+    # workers report the stages they render, this process only writing
+    for buffer in parallel.imap_ordered(_render_frame, times, workers, _init_worker, (resolution, dt)):
+        with timing.stage('write'):
+            f.write(buffer)
+        timing.frame()
 
 
 def main():
-    resolution = parse_resolution(os.environ.get('RESOLUTION', '720x720'))
-    animate(sys.stdout.buffer, resolution, dt=1/60)
+    resolution = preview.scale(parse_resolution(os.environ.get('RESOLUTION', '720x720')))
+    workers = int(os.environ.get('WORKERS', os.cpu_count() or 1))
+    with sink.open_sink(resolution) as f:
+        animate(f, resolution, dt=1/60, workers=workers)
 
 
 if __name__ == "__main__":
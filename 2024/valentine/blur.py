@@ -0,0 +1,33 @@
+"""Motion blur by averaging sub-frames in an integer accumulator"""
+from typing import Tuple
+
+import numpy as np
+
+
+class MotionBlur:
+    """Sums n uint8 sub-frames into a preallocated buffer and averages them in place.
+
+    uint16 holds the sum of up to 257 sub-frames, more than that uses uint32.
+    """
+    def __init__(self, shape: Tuple[int, ...], n: int):
+        self.n = n
+        dtype = np.uint16 if n * 255 <= np.iinfo(np.uint16).max else np.uint32
+        self.total = np.zeros(shape, dtype=dtype)
+        self.frame = np.empty(shape, dtype=np.uint8)
+        self.count = 0
+
+    def clear(self) -> None:
+        self.total.fill(0)
+        self.count = 0
+
+    def add(self, frame: np.ndarray) -> None:
+        assert self.count < self.n
+        np.add(self.total, frame, out=self.total)
+        self.count += 1
+
+    def result(self) -> np.ndarray:
+        """Average of the added sub-frames rounded down, valid until the next call"""
+        assert self.count == self.n
+        np.floor_divide(self.total, self.n, out=self.total)
+        np.copyto(self.frame, self.total, casting='unsafe')
+        return self.frame
@@ -0,0 +1,59 @@
+"""Content addressed on-disk cache for geometry and arrays"""
+import os
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+
+Entry = Dict[str, Any]
+
+
+def pack(geometries: Sequence[BaseGeometry]) -> Tuple[np.ndarray, np.ndarray]:
+    """Packs geometries as concatenated WKB and end offsets"""
+    wkb = shapely.to_wkb(geometries)
+    offsets = np.cumsum([len(w) for w in wkb])
+    return np.frombuffer(b''.join(wkb), dtype=np.uint8), offsets
+
+
+def unpack(data: np.ndarray, offsets: np.ndarray) -> List[BaseGeometry]:
+    starts = np.concatenate([[0], offsets[:-1]])
+    return list(shapely.from_wkb([data[a:b].tobytes() for a, b in zip(starts, offsets)]))
+
+
+def save(path: str, entry: Entry) -> None:
+    """Stores arrays as is and lists of geometry as WKB in an npz file"""
+    arrays = {}
+    for name, value in entry.items():
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+        else:
+            arrays[name + '.wkb'], arrays[name + '.offsets'] = pack(value)
+    # write to a temporary file first so a partial entry is never read
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def load(path: str) -> Entry:
+    entry = {}
+    with np.load(path) as arrays:
+        for name in arrays.files:
+            if name.endswith('.wkb'):
+                name = name.removesuffix('.wkb')
+                entry[name] = unpack(arrays[name + '.wkb'], arrays[name + '.offsets'])
+            elif not name.endswith('.offsets'):
+                entry[name] = arrays[name]
+    return entry
+
+
+def cached(directory: str, key: str, compute: Callable[[], Entry]) -> Entry:
+    """Loads entry for key from directory, computing and storing it if missing"""
+    path = os.path.join(directory, key + '.npz')
+    if os.path.exists(path):
+        return load(path)
+    entry = compute()
+    os.makedirs(directory, exist_ok=True)
+    save(path, entry)
+    return entry
@@ -0,0 +1,34 @@
+"""Maps frames over a process pool, yielding results in order"""
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import AsyncResult
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional, Sequence, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def imap_ordered(
+    function: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Sequence[Any] = (),
+    ahead: Optional[int] = None,
+) -> Iterator[R]:
+    """Applies function to items on worker processes and yields the results in order.
+
+    Items finish out of order, and each result waits in its slot of the in flight
+    window until all earlier results are yielded. At most ahead items are in
+    flight, so a slow consumer bounds memory use.
+    """
+    ahead = ahead or 2 * workers
+    with Pool(workers, initializer, initargs) as pool:
+        window = deque()  # type: Deque[AsyncResult[R]]
+        for item in items:
+            if len(window) >= ahead:
+                yield window.popleft().get()
+            window.append(pool.apply_async(function, (item,)))
+        while window:
+            yield window.popleft().get()
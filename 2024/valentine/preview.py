@@ -0,0 +1,15 @@
+"""Draft renders for quick previews, see common/preview.py.
+
+Here a preview also leaves out the motion blur.
+"""
+import os
+from typing import List, Sequence
+
+from common.preview import scale, selected
+
+
+ENABLED = bool(os.environ.get('PREVIEW'))
+
+
+def select(times: Sequence[float]) -> List[float]:
+    return [t for index, t in enumerate(times) if selected(index, t)]
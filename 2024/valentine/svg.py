@@ -1,9 +1,13 @@
-from typing import Iterable, Tuple
+from math import ceil, radians, sqrt
+from typing import Iterable, Optional, Tuple
 from xml.dom import minidom
 
+import numpy as np
 from shapely import MultiPolygon, Polygon, Point
 import svg.path
 
+from valentine.resolution import Resolution
+
 
 def parse_point(point_string: str) -> Point:
     x, y = point_string.split(',')
@@ -33,28 +37,93 @@ def to_point(c: complex) -> Point:
     return c.real, c.imag
 
 
-# todo, sample using tangent gradient rather than hard coded
-def sample_curve(curve: svg.path.Path) -> Iterable[Tuple[float, float]]:
-    n = 64
-    ts = (i / n for i in range(n))
-    yield from (to_point(curve.point(t)) for t in ts)
-
-def sample_path(path: svg.path.Path) -> Polygon:
+def control_points(segment: svg.path.PathSegment) -> Tuple[complex, ...]:
+    if isinstance(segment, svg.path.CubicBezier):
+        return segment.start, segment.control1, segment.control2, segment.end
+    if isinstance(segment, svg.path.QuadraticBezier):
+        return segment.start, segment.control, segment.end
+    return segment.start, segment.end
+
+
+def subdivisions(segment: svg.path.PathSegment, tolerance: float) -> int:
+    """Number of lines needed to stay within tolerance of the segment, from a bound on its curvature"""
+    if isinstance(segment, svg.path.Arc):
+        # |p''(t)| for an arc is radius * sweep^2
+        radius = segment.radius * segment.radius_scale
+        curvature = max(abs(radius.real), abs(radius.imag)) * radians(segment.delta) ** 2
+    elif isinstance(segment, (svg.path.CubicBezier, svg.path.QuadraticBezier)):
+        # bound |p''(t)| by the second differences of the control polygon
+        p = np.array(control_points(segment))
+        degree = len(p) - 1
+        curvature = degree * (degree - 1) * np.max(np.abs(p[2:] - 2 * p[1:-1] + p[:-2]))
+    else:
+        return 1
+    return max(1, ceil(sqrt(curvature / (8 * tolerance))))
+
+
+def evaluate(segment: svg.path.PathSegment, t: np.ndarray) -> np.ndarray:
+    """Points on segment for all t at once"""
+    if isinstance(segment, svg.path.CubicBezier):
+        p0, p1, p2, p3 = control_points(segment)
+        s = 1 - t
+        return s**3 * p0 + 3 * s**2 * t * p1 + 3 * s * t**2 * p2 + t**3 * p3
+    if isinstance(segment, svg.path.QuadraticBezier):
+        p0, p1, p2 = control_points(segment)
+        s = 1 - t
+        return s**2 * p0 + 2 * s * t * p1 + t**2 * p2
+    if isinstance(segment, svg.path.Arc) and segment.radius.real != 0 and segment.radius.imag != 0:
+        angle = np.radians(segment.theta + segment.delta * t)
+        rotation = np.exp(1j * radians(segment.rotation))
+        radius = segment.radius * segment.radius_scale
+        return segment.center + rotation * (radius.real * np.cos(angle) + 1j * radius.imag * np.sin(angle))
+    return segment.start + (segment.end - segment.start) * t
+
+
+def sample_curve(curve: svg.path.Path, tolerance: float) -> np.ndarray:
+    """Flattens curve into polygon vertices, staying within tolerance of it"""
+    points = []
+    for segment in curve:
+        if segment.start == segment.end:
+            continue
+        n = subdivisions(segment, tolerance)
+        points.append(evaluate(segment, np.arange(n) / n))
+    p = np.concatenate(points)
+    return np.column_stack([p.real, p.imag])
+
+
+def sample_path(path: svg.path.Path, tolerance: float) -> Polygon:
     curves = split_on_move(path)
-    polygons = [sample_curve(curve) for curve in curves]
+    polygons = [sample_curve(curve, tolerance) for curve in curves]
     # todo: select by winding
     exterior = polygons[-1]
     holes = polygons[:-1]
     return Polygon(exterior, holes)
 
 
-def load(path: str) -> MultiPolygon:
+def bounds(polygons: Iterable[Polygon], paths: Iterable[svg.path.Path]) -> Tuple[float, float, float, float]:
+    """Bounds of polygon vertices and path control points, which contain the curves"""
+    points = [complex(x, y) for polygon in polygons for x, y in polygon.exterior.coords]
+    points.extend(p for path in paths for segment in path for p in control_points(segment))
+    x, y = np.real(points), np.imag(points)
+    return x.min(), y.min(), x.max(), y.max()
+
+
+def load(path: str, size: Optional[Resolution] = None, tolerance: float = 0.25) -> MultiPolygon:
+    """Loads polygons and paths as polygons.
+
+    Curves are flattened to within tolerance, which is in pixels when the
+    drawing is to be fitted into size and in svg units otherwise.
+    """
     doc = minidom.parse(path)
     polygons = [parse_polygon(path.getAttribute('points')) for path in doc.getElementsByTagName('polygon')]
     paths = [svg.path.parse_path(path.getAttribute('d')) for path in doc.getElementsByTagName('path')]
 
+    if size:
+        xmin, ymin, xmax, ymax = bounds(polygons, paths)
+        tolerance /= min(size[0] / (xmax - xmin), size[1] / (ymax - ymin))
+
     everything = MultiPolygon(
-        polygons + [sample_path(path) for path in paths],
+        polygons + [sample_path(path, tolerance) for path in paths],
     )
     doc.unlink()
     return everything
@@ -2,7 +2,9 @@
 import random
 from typing import Dict, List, Sequence, Tuple
 
-from shapely import box, MultiPolygon, Polygon, LineString
+import numpy as np
+import shapely
+from shapely import box, MultiPolygon, Polygon, LineString, STRtree
 from shapely.ops import split
 
 from valentine.resolution import Resolution
@@ -16,9 +18,14 @@ def rectangle_for(resolution: Resolution) -> Polygon:
 def cut_by_lines(polygons: MultiPolygon, lines: Sequence[LineString]) -> MultiPolygon:
     todo = [polygons]
     for line in lines:
+        # only split pieces the line touches, the rest are kept in place
+        crossing = shapely.intersects(todo, line)
         tmp = []
-        for polygon in todo:
-            tmp.extend(split(polygon, line).geoms)
+        for polygon, crosses in zip(todo, crossing):
+            if crosses:
+                tmp.extend(split(polygon, line).geoms)
+            else:
+                tmp.append(polygon)
         todo = tmp
     return MultiPolygon(todo)
 
@@ -51,11 +58,56 @@ def create_templates(
     return cut_by_lines(rectangle_for(resolution), linesegments)
 
 
-def cut(polygons: MultiPolygon, templates: MultiPolygon) -> List[Polygon]:
-    """Cuts a MultiPolygon by lines"""
-    return [polygons.intersection(template) for template in templates.geoms]
+def jittered_points(
+    resolution: Resolution,
+    grid: Resolution,
+    value: float = 0.5,
+    rnd: random.Random = random,
+) -> np.ndarray:
+    """One point per grid cell, moved from the cell center by up to value / 2 of a cell"""
+    width, height = resolution
+    columns, rows = grid
+    jitter = np.array([rnd.random() for _ in range(2 * columns * rows)]).reshape(rows, columns, 2) - 0.5
+    gy, gx = np.mgrid[0:rows, 0:columns]
+    x = width * (gx + 0.5 + value * jitter[..., 0]) / columns
+    y = height * (gy + 0.5 + value * jitter[..., 1]) / rows
+    return np.stack([x.ravel(), y.ravel()], axis=-1)
 
 
-def area(resolution: Resolution) -> int:
-    width, height = resolution
-    return (width + 1) * (height + 1)
\ No newline at end of file
+def create_voronoi_templates(
+    resolution: Resolution,
+    grid: Resolution,
+    value: float = 0.5,
+    rnd: random.Random = random,
+) -> MultiPolygon:
+    """Voronoi cells of jittered grid points, one template per grid cell"""
+    rectangle = rectangle_for(resolution)
+    points = shapely.multipoints(jittered_points(resolution, grid, value, rnd))
+    cells = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=rectangle))
+    return MultiPolygon(list(shapely.intersection(cells, rectangle)))
+
+
+# ways to shatter a rectangle into templates
+TEMPLATES = {
+    'lines': create_templates,
+    'voronoi': create_voronoi_templates,
+}
+
+
+def cut(polygons: MultiPolygon, templates: MultiPolygon) -> List[Polygon]:
+    """Cuts a MultiPolygon into one piece per template, empty where they do not overlap.
+
+    Each template is only intersected with the polygons an STRtree finds near it.
+    """
+    parts = shapely.get_parts(polygons)
+    templates = shapely.get_parts(templates)
+    template_index, part_index = STRtree(parts).query(templates, predicate='intersects')
+    pieces = np.full(len(templates), Polygon())
+    if len(template_index):
+        # group candidate parts per template, keeping their order in polygons
+        order = np.lexsort((part_index, template_index))
+        template_index, part_index = template_index[order], part_index[order]
+        hit, starts = np.unique(template_index, return_index=True)
+        candidates = [MultiPolygon(list(group)) for group in np.split(parts[part_index], starts[1:])]
+        pieces[hit] = shapely.intersection(candidates, templates[hit])
+    return list(pieces)
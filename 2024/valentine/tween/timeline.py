@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Dict, List, Sequence, Tuple
+from typing import Callable, Dict, Optional, Sequence, Union
+
+import numpy as np
 
 from . import tweens
 
 
+# tweens take and return either scalars or arrays of times
+Time = Union[float, np.ndarray]
+
+
 def lerp(a: float, b: float, t: float) -> float:
     return (1 - t) * a + t * b
 
@@ -15,7 +21,7 @@ class Tween(ABC):
         self.stop = stop
         self.duration = duration
 
-    def __call__(self, t: float) -> float:
+    def __call__(self, t: Time) -> Time:
         normalized_t = t / self.duration
         return lerp(self.start, self.stop, self.__class__.f(normalized_t))
 
@@ -37,42 +43,62 @@ class Constant(Tween):
         self.value = value
         self.duration = duration
 
-    def __call__(self, t: float) -> float:
-        del t
-        return self.value
+    def __call__(self, t: Time) -> Time:
+        if np.ndim(t) == 0:
+            return self.value
+        return np.full(np.shape(t), self.value, dtype=float)
 
 
 class TweenSequence(Tween):
     def __init__(self, tweens: Sequence[Tween]) -> None:
         self.tweens = tweens
+        self.ends = np.cumsum([tween.duration for tween in tweens])
+        # times outside the sequence are passed to the last tween, relative to the end
+        self.starts = np.concatenate([[0], self.ends])
+        self._duration = float(self.ends[-1])
+        self.constants = np.array([isinstance(tween, Constant) for tween in tweens])
+
+    def _find_tween(self, t: np.ndarray) -> np.ndarray:
+        """Index of the tween covering each t by binary search in the end times"""
+        index = np.searchsorted(self.ends, t, side='right')
+        index[t < 0] = len(self.tweens)
+        return index
+
+    def __call__(self, t: Time) -> Time:
+        ts = np.asarray(t, dtype=float).reshape(-1)
+        index = self._find_tween(ts)
+        values = np.empty(len(ts))
+        for i in np.unique(index):
+            mask = index == i
+            tween = self.tweens[min(i, len(self.tweens) - 1)]
+            values[mask] = tween(ts[mask] - self.starts[i])
+        if np.ndim(t) == 0:
+            return float(values[0])
+        return values.reshape(np.shape(t))
     
-    def _find_tween(self, t: float) -> Tuple[Tween, float]:
-        start = 0
-        for tween in self.tweens:
-            if t >= start and t < tween.duration + start:
-                #return tween, start
-                break
-            start += tween.duration
-        return tween, start
-
-    def __call__(self, t: float) -> float:
-        # find correct tween
-        tween, start = self._find_tween(t)
-        return tween(t - start)
-    
+    def constant(self, t: Time) -> np.ndarray:
+        """Whether each t falls in a Constant tween"""
+        ts = np.asarray(t, dtype=float).reshape(-1)
+        index = np.minimum(self._find_tween(ts), len(self.tweens) - 1)
+        return self.constants[index].reshape(np.shape(t))
+
     def duration(self) -> float:
-        return sum(tween.duration for tween in self.tweens)
+        return self._duration
 
 
 class Timeline:
     def __init__(self):
-        self.tags: Dict[str, List[Tuple[Tween, float]]] = {}
+        self.tags: Dict[str, Tween] = {}
+        self._duration: Optional[float] = None
 
     def add(self, tag: str, tween: Tween) -> None:
         self.tags[tag] = tween
+        self._duration = None
 
     def tag(self, tag: str) -> Tween:
         return self.tags[tag]
 
     def duration(self) -> float:
-        return max(tween.duration() for tween in self.tags.values())
+        if self._duration is None:
+            self._duration = max(tween.duration() for tween in self.tags.values())
+        return self._duration
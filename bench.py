@@ -0,0 +1,206 @@
+"""Headless frame rate benchmark of the yearly renderers.
+
+Runs each year's main.py for a fixed number of frames, reading the raw frames
+from its stdout, and reports frames per second, per-frame latency percentiles,
+peak memory and a checksum of the frames.
+
+    python bench.py                         # run everything
+    python bench.py 2024 --frames 120       # run one year
+    python bench.py --save bench.json       # store results as a baseline
+    python bench.py --compare bench.json    # compare with a stored baseline
+
+Extra environment, like WORKERS=1, is passed on to the renderers.
+A renderer that stops before the requested number of frames is reported as
+FAILED with the last line of its stderr, and the exit status is then 1.
+"""
+import argparse
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+
+@dataclass
+class Case:
+    year: str
+    name: str
+    resolutions: Sequence[str]
+    bytes_per_pixel: int = 4
+    # environment variable controlling the amount of particles or pieces, and its values
+    count: Optional[str] = None
+    counts: Sequence[str] = ()
+    env: Dict[str, str] = field(default_factory=dict)
+
+
+SUITE = [
+    Case('2021', 'fluid', ['100x100', '200x200'], bytes_per_pixel=3),
+    Case('2022', 'worms', ['360x360', '720x720']),
+    Case('2023', 'flow', ['360x360', '720x720'], count='PARTICLES', counts=['1024', '4096']),
+    Case('2024', 'shatter', ['360x360', '720x720'], count='GRID', counts=['7x7', '32x32']),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def peak_rss(pid: int) -> int:
+    """Sum of peak resident set sizes in kB of the process group of pid, linux only"""
+    total = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the process group is the fifth field, after the parenthesised command
+                pgid = int(f.read().rsplit(')', 1)[1].split()[2])
+            if pgid != pid:
+                continue
+            with open(f'/proc/{entry}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def run(case: Case, resolution: str, count: Optional[str], frames: int) -> dict:
+    width, height = (int(d) for d in resolution.split('x'))
+    frame_size = width * height * case.bytes_per_pixel
+    env = dict(os.environ, RESOLUTION=resolution, **case.env)
+    env.pop('OUTPUT', None)
+    if count:
+        env[case.count] = count
+
+    # stderr goes to a file, so a chatty renderer can not block on a full pipe
+    errors = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'main.py'],
+        cwd=case.year,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=errors,
+        start_new_session=True,
+    )
+    checksum = hashlib.sha256()
+    latencies = []
+    first = None
+    rss = 0
+    try:
+        last = start
+        for _ in range(frames):
+            frame = process.stdout.read(frame_size)
+            if len(frame) < frame_size:
+                break
+            now = time.perf_counter()
+            if first is None:
+                first = now - start
+            else:
+                latencies.append(now - last)
+            last = now
+            checksum.update(frame)
+        rss = peak_rss(process.pid)
+        # None while the renderer is still running, as it should be after enough frames
+        status = process.poll()
+    finally:
+        # stop the renderer and any workers it started
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        process.stdout.close()
+        process.wait()
+
+    rendered = len(latencies) + (first is not None)
+    elapsed = sum(latencies)
+    error = None
+    if rendered < frames or status:
+        errors.seek(0)
+        lines = errors.read().decode(errors='replace').strip().splitlines()
+        error = lines[-1] if lines else f'exited with {status}'
+    errors.close()
+    return {
+        'case': f'{case.year}-{case.name}',
+        'resolution': resolution,
+        'count': count,
+        'frames': rendered,
+        'startup': first,
+        'fps': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 50) if latencies else None,
+        'p90': percentile(latencies, 90) if latencies else None,
+        'p99': percentile(latencies, 99) if latencies else None,
+        'rss': rss,
+        'checksum': checksum.hexdigest()[:16],
+        'status': status,
+        'error': error,
+    }
+
+
+def key(result: dict) -> str:
+    return f"{result['case']} {result['resolution']} {result['count'] or ''}".strip()
+
+
+def show(result: dict, baseline: Optional[dict]) -> str:
+    def ms(seconds: Optional[float]) -> str:
+        return '-' if seconds is None else f'{1000 * seconds:.1f}'
+
+    line = '{:34} {:>4} frames {:>7} fps  p50 {:>7} p90 {:>7} p99 {:>7} ms  {:>7} MB  {}'.format(
+        key(result),
+        result['frames'],
+        '-' if result['fps'] is None else f"{result['fps']:.1f}",
+        ms(result['p50']), ms(result['p90']), ms(result['p99']),
+        f"{result['rss'] / 1024:.0f}",
+        result['checksum'],
+    )
+    if baseline:
+        if baseline['fps'] and result['fps']:
+            line += f"  {result['fps'] / baseline['fps']:.2f}x"
+        if baseline['frames'] != result['frames'] or baseline['checksum'] != result['checksum']:
+            line += '  CHANGED OUTPUT'
+    if result['error']:
+        line += f"  FAILED: {result['error']}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the yearly renderers')
+    parser.add_argument('years', nargs='*', help='years to run, all by default')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--save', help='store results as a baseline in this file')
+    parser.add_argument('--compare', help='compare with the baseline in this file')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {key(result): result for result in json.load(f)}
+
+    results = []
+    for case in SUITE:
+        if args.years and case.year not in args.years:
+            continue
+        for resolution in case.resolutions:
+            for count in case.counts or [None]:
+                result = run(case, resolution, count, args.frames)
+                results.append(result)
+                print(show(result, baseline.get(key(result))), flush=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if any(result['error'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
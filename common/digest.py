@@ -0,0 +1,21 @@
+"""Content digests, for naming cached results after everything they depend on"""
+import hashlib
+from typing import Any, Iterable, List
+
+
+def digest(*parts: Any) -> str:
+    """Hashes bytes as is and everything else by repr"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def contents(paths: Iterable[str]) -> List[bytes]:
+    """Contents of the files at paths, to digest along with the other parts"""
+    result = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            result.append(f.read())
+    return result
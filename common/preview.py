@@ -0,0 +1,33 @@
+"""Draft renders for quick previews, configured from the environment.
+
+PREVIEW=k renders at 1/k of the resolution. FRAME_STEP=k renders only every
+k-th frame and WINDOW=start:end only the frames in that range of the time of
+each year's animation, where either end may be left out. stream.sh divides
+its video size by PREVIEW too. What else a preview leaves out is up to each
+year.
+"""
+import os
+from typing import Tuple
+
+
+DIVISOR = int(os.environ.get('PREVIEW') or 1)
+STEP = int(os.environ.get('FRAME_STEP', 1))
+
+
+def parse_window(window: str) -> Tuple[float, float]:
+    start, _, end = window.partition(':')
+    return float(start or '-inf'), float(end or 'inf')
+
+
+WINDOW = parse_window(os.environ.get('WINDOW', ':'))
+
+
+def scale(resolution: Tuple[int, int]) -> Tuple[int, int]:
+    width, height = resolution
+    return width // DIVISOR, height // DIVISOR
+
+
+def selected(index: int, t: float) -> bool:
+    """Whether frame index at time t should be rendered"""
+    start, end = WINDOW
+    return index % STEP == 0 and start <= t < end
@@ -0,0 +1,121 @@
+"""Feeds raw video frames to an encoder, or stdout, from a writer thread"""
+import os
+import subprocess
+import sys
+import time
+from queue import Queue
+from threading import Thread
+from typing import BinaryIO, List, Optional, Tuple
+
+
+def encoder_args(
+        resolution: Tuple[int, int],
+        fps: float,
+        output: str,
+        pixel_format: str = 'rgb32',
+        encoder: str = 'ffmpeg',
+) -> List[str]:
+    """Command line reading rawvideo of resolution on stdin and encoding it to output"""
+    width, height = resolution
+    args = [
+        encoder, '-hide_banner', '-loglevel', 'warning',
+        '-f', 'rawvideo', '-pixel_format', pixel_format, '-framerate', f'{fps:g}',
+        '-video_size', f'{width}x{height}', '-i', '-',
+    ]
+    if output.endswith('.gif'):
+        args += ['-vf', f'fps={fps:g},split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse']
+    return args + ['-metadata', 'comment=vidstige', '-y', output]
+
+
+class FrameSink:
+    """Writes fixed size frames to stream from a writer thread.
+
+    Frames are copied into a small pool of recycled buffers, so the caller can
+    reuse its frame right away. When the stream falls behind, write blocks
+    until a buffer is free, and the time spent waiting is reported on close.
+    """
+    def __init__(
+            self,
+            stream: BinaryIO,
+            frame_size: int,
+            buffers: int = 4,
+            process: Optional[subprocess.Popen] = None,
+    ):
+        self.stream = stream
+        self.frame_size = frame_size
+        self.process = process
+        self.free = Queue()  # type: Queue[bytearray]
+        for _ in range(buffers):
+            self.free.put(bytearray(frame_size))
+        # None marks the end
+        self.pending = Queue()  # type: Queue[Optional[bytearray]]
+        self.error = None  # type: Optional[BaseException]
+        self.frames = 0
+        self.stalls = 0
+        self.stalled = 0.0
+        self.writer = Thread(target=self._drain, daemon=True)
+        self.writer.start()
+
+    def _drain(self) -> None:
+        while True:
+            buffer = self.pending.get()
+            if buffer is None:
+                break
+            try:
+                if self.error is None:
+                    self.stream.write(buffer)
+            except BaseException as e:
+                self.error = e
+            self.free.put(buffer)
+
+    def write(self, frame) -> None:
+        """Queues a copy of frame, blocks while all buffers are waiting for the stream"""
+        if self.error:
+            raise self.error
+        data = memoryview(frame).cast('B')
+        if len(data) != self.frame_size:
+            raise ValueError(f'frame is {len(data)} bytes, expected {self.frame_size}')
+        if self.free.empty():
+            self.stalls += 1
+            start = time.perf_counter()
+            buffer = self.free.get()
+            self.stalled += time.perf_counter() - start
+        else:
+            buffer = self.free.get()
+        buffer[:] = data
+        self.pending.put(buffer)
+        self.frames += 1
+
+    def close(self) -> None:
+        """Waits for all frames to be written and for the encoder to finish"""
+        self.pending.put(None)
+        self.writer.join()
+        if self.process:
+            self.stream.close()
+            if self.process.wait() != 0 and self.error is None:
+                self.error = RuntimeError(f'{self.process.args[0]} exited with {self.process.returncode}')
+        else:
+            self.stream.flush()
+        if self.stalls:
+            print(f'waited {self.stalled:.2f}s for the encoder on {self.stalls} of {self.frames} frames', file=sys.stderr)
+        if self.error:
+            raise self.error
+
+    def __enter__(self) -> 'FrameSink':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_sink(resolution: Tuple[int, int], pixel_format: str = 'rgb32', bytes_per_pixel: int = 4) -> FrameSink:
+    """Encodes to the OUTPUT file if set, using ENCODER (default ffmpeg), and writes to stdout otherwise"""
+    width, height = resolution
+    frame_size = width * height * bytes_per_pixel
+    output = os.environ.get('OUTPUT')
+    if not output:
+        return FrameSink(sys.stdout.buffer, frame_size)
+    fps = float(os.environ.get('FPS', 30))
+    args = encoder_args(resolution, fps, output, pixel_format, os.environ.get('ENCODER', 'ffmpeg'))
+    process = subprocess.Popen(args, stdin=subprocess.PIPE)
+    return FrameSink(process.stdin, frame_size, process=process)
@@ -0,0 +1,94 @@
+"""Optional timing of named render stages, enabled by setting TIMING.
+
+Stage times are summed per frame, also across threads, and written to stderr
+as one json line per frame, followed by a summary when the program exits.
+Stages may nest, the time of the inner stage then also counts towards the
+outer one. When disabled, stage returns a shared no-op context manager, so
+the calls can stay in place.
+"""
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from threading import Lock
+from typing import ContextManager, Dict, List
+
+
+ENABLED = bool(os.environ.get('TIMING'))
+# upper bounds of the histogram buckets in milliseconds
+BUCKETS = [0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000]
+
+_lock = Lock()
+_current = {}  # type: Dict[str, float]
+_samples = {}  # type: Dict[str, List[float]]
+_frames = 0
+_disabled = nullcontext()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            _current[self.name] = _current.get(self.name, 0.0) + elapsed
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Times the with block as part of the named stage of the current frame"""
+    if not ENABLED:
+        return _disabled
+    return _Stage(name)
+
+
+def frame() -> None:
+    """Ends the current frame and writes the time of each of its stages in ms"""
+    global _frames
+    if not ENABLED:
+        return
+    with _lock:
+        current = dict(_current)
+        _current.clear()
+        index = _frames
+        _frames += 1
+        for name, seconds in current.items():
+            _samples.setdefault(name, []).append(seconds)
+    line = {'frame': index, 'pid': os.getpid()}
+    line.update((name, round(1000 * seconds, 3)) for name, seconds in current.items())
+    print(json.dumps(line), file=sys.stderr)
+
+
+def histogram(milliseconds: List[float]) -> str:
+    counts = [0] * (len(BUCKETS) + 1)
+    for ms in milliseconds:
+        counts[sum(ms >= bound for bound in BUCKETS)] += 1
+    labels = [f'<{bound:g}' for bound in BUCKETS] + [f'>={BUCKETS[-1]:g}']
+    return ' '.join(f'{label}:{count}' for label, count in zip(labels, counts) if count)
+
+
+def summary() -> str:
+    lines = [f'{"stage":12} {"frames":>6} {"mean":>9} {"p50":>9} {"p90":>9} {"p99":>9} {"max":>9} ms']
+    for name, samples in sorted(_samples.items()):
+        ms = sorted(1000 * s for s in samples)
+        n = len(ms)
+        lines.append(f'{name:12} {n:6} {sum(ms) / n:9.3f} {ms[n // 2]:9.3f} {ms[int(0.9 * n)]:9.3f} {ms[int(0.99 * n)]:9.3f} {ms[-1]:9.3f}')
+        lines.append(f'{"":12} {histogram(ms)}')
+    return '\n'.join(lines)
+
+
+def report() -> None:
+    with _lock:
+        if _samples:
+            print(summary(), file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(report)